@@ -0,0 +1,163 @@
+import os
+import math
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import monotonic
+
+# Admission control for /question. At most ADMISSION_MAX_CONCURRENT questions
+# run at once in a worker, up to ADMISSION_MAX_QUEUE more wait for a slot,
+# and anything beyond that is turned away at once with a 429 and a
+# Retry-After estimate; a request that waits longer than
+# ADMISSION_QUEUE_TIMEOUT_SECONDS gets a 503. Every admitted request carries
+# a Deadline that retrieval, the LLM calls and the database calls respect,
+# and while requests are queueing the optional relevance judge is skipped.
+# The counters are served in the Prometheus text format by metrics_text().
+
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+# Skip the relevance judge while at least this many requests are waiting.
+ADMISSION_SHED_QUEUE_DEPTH = int(os.getenv("ADMISSION_SHED_QUEUE_DEPTH", "1"))
+# Skip the relevance judge when less than this is left of the deadline.
+ADMISSION_JUDGE_MIN_SECONDS = float(os.getenv("ADMISSION_JUDGE_MIN_SECONDS", "3"))
+# Time budget of a question, kept below gunicorn's 30 second worker timeout.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "25"))
+# Time the conversation insert always gets, even past the deadline, so an
+# answer that made it in time is not lost to a millisecond statement_timeout.
+ADMISSION_SAVE_MIN_SECONDS = float(os.getenv("ADMISSION_SAVE_MIN_SECONDS", "2"))
+# Threads running LLM requests, so a caller can stop waiting at its deadline
+# (see resilience.py).
+LLM_CALL_THREADS = int(os.getenv("LLM_CALL_THREADS", "32"))
+
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Rejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(f"Request rejected: {reason}")
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Deadline:
+    def __init__(self, seconds=REQUEST_DEADLINE_SECONDS):
+        self.expires = monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - monotonic())
+
+    def check(self, stage):
+        if monotonic() >= self.expires:
+            count("deadline_exceeded", stage)
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+# Counters keyed by (kind, *labels), for metrics_text().
+metrics = Counter()
+metrics_lock = threading.Lock()
+
+
+def count(*key):
+    with metrics_lock:
+        metrics[key] += 1
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        # Moving average of how long an admitted request holds its slot.
+        self.service_time = 1.0
+        self.condition = threading.Condition()
+
+    def retry_after(self):
+        # Time for the requests ahead of a retry to drain, in whole seconds.
+        seconds = self.service_time * (self.waiting + 1) / self.max_concurrent
+        return min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(seconds)))
+
+    @contextmanager
+    def admit(self, deadline):
+        with self.condition:
+            if self.running >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    count("rejected", "queue_full")
+                    raise Rejected(429, "queue_full", self.retry_after())
+
+                self.waiting += 1
+                try:
+                    admitted = self.condition.wait_for(
+                        lambda: self.running < self.max_concurrent,
+                        timeout=min(self.queue_timeout, deadline.remaining()),
+                    )
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    count("rejected", "queue_timeout")
+                    raise Rejected(503, "queue_timeout", self.retry_after())
+            self.running += 1
+
+        started = monotonic()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.running -= 1
+                self.service_time = 0.8 * self.service_time + 0.2 * (monotonic() - started)
+                self.condition.notify()
+
+    def should_shed(self):
+        """True when optional work should be skipped because requests are queueing."""
+        return self.waiting >= ADMISSION_SHED_QUEUE_DEPTH
+
+    def gauges(self):
+        return {
+            "admission_in_flight": self.running,
+            "admission_queue_depth": self.waiting,
+            "admission_max_concurrent": self.max_concurrent,
+            "admission_max_queue": self.max_queue,
+        }
+
+
+def record_shed(stage, reason):
+    count("shed", stage, reason)
+
+
+llm_executor = ThreadPoolExecutor(max_workers=LLM_CALL_THREADS, thread_name_prefix="llm")
+
+
+def metrics_text(controller):
+    lines = []
+    for name, value in controller.gauges().items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    counters = {
+        "rejected": ("admission_rejected_total", ["reason"]),
+        "shed": ("admission_shed_total", ["stage", "reason"]),
+        "deadline_exceeded": ("admission_deadline_exceeded_total", ["stage"]),
+        "abandoned": ("admission_abandoned_calls_total", ["stage"]),
+        "retried": ("llm_retries_total", ["stage"]),
+        "hedged": ("llm_hedged_total", ["stage"]),
+        "hedge_won": ("llm_hedge_wins_total", ["stage"]),
+        "hedge_denied": ("llm_hedge_denied_total", ["stage"]),
+    }
+    with metrics_lock:
+        snapshot = sorted(metrics.items())
+    for kind, (name, labels) in counters.items():
+        lines.append(f"# TYPE {name} counter")
+        for key, value in snapshot:
+            if key[0] == kind:
+                label_text = ",".join(f'{label}="{text}"' for label, text in zip(labels, key[1:]))
+                lines.append(f"{name}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
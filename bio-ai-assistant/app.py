@@ -1,12 +1,21 @@
 import uuid
+from time import time
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 
-from rag import rag
+from rag import rag, search_with_scores
 
 import db
+import routing
+import admission
+import profiling
+import single_flight
 
 app = Flask(__name__)
+profiling.init_app(app)
+
+flights = single_flight.SingleFlight()
+admission_controller = admission.AdmissionController()
 
 def initialize_database():
     db.init_db()
@@ -21,7 +30,48 @@ def handle_question():
 
     conversation_id = str(uuid.uuid4())
 
-    answer_data = rag(question)
+    t0 = time()
+    # Every stage below gives up once the deadline passes, and requests over
+    # the concurrency limit queue briefly or are turned away.
+    deadline = admission.Deadline()
+    try:
+        with admission_controller.admit(deadline):
+            hits = search_with_scores(question, deadline=deadline)
+            search_results = [doc for doc, _ in hits]
+            model, routing_reason, routing_time = routing.route(question, [score for _, score in hits])
+            # The relevance judge is optional, so it is the first thing
+            # dropped while requests are queueing for a slot.
+            judge = not admission_controller.should_shed()
+
+            # Identical questions with identical search results asked at the same
+            # time share one answer; every request still gets its own conversation.
+            key = single_flight.flight_key(question, search_results, model)
+            answer_data, shared = flights.run(
+                key,
+                lambda: rag(question, model=model, search_results=search_results,
+                            deadline=deadline, judge=judge),
+                deadline=deadline,
+            )
+            if shared:
+                answer_data = single_flight.shared_answer(answer_data)
+            else:
+                answer_data = dict(answer_data)
+            # Timed from arrival, so retrieval and queueing count for every row.
+            answer_data["response_time"] = time() - t0
+            answer_data["routing_reason"] = routing_reason
+            answer_data["routing_time"] = routing_time
+
+            status = db.save_conversation(
+                    conversation_id=conversation_id,
+                    question=question,
+                    answer_data=answer_data,
+                    timeout=max(deadline.remaining(), admission.ADMISSION_SAVE_MIN_SECONDS),
+                )
+    except admission.Rejected as e:
+        return jsonify({"error": "Server busy, retry later"}), e.status, {"Retry-After": str(e.retry_after)}
+    except admission.DeadlineExceeded as e:
+        print(f"Question abandoned: {e}")
+        return jsonify({"error": "Question timed out"}), 504
 
     result = {
         "conversation_id": conversation_id,
@@ -29,17 +79,17 @@ def handle_question():
         "answer": answer_data["answer"],
     }
 
-    status = db.save_conversation(
-            conversation_id=conversation_id,
-            question=question,
-            answer_data=answer_data,
-        )
-
     if status:
         return jsonify(result)
     else:
         return jsonify({"error": "Conversation not saved"}), 400
 
+@app.route("/metrics", methods=["GET"])
+def handle_metrics():
+    # Admission counters and gauges of the worker that serves the scrape,
+    # in the Prometheus text format.
+    return Response(admission.metrics_text(admission_controller), mimetype="text/plain; version=0.0.4")
+
 @app.route("/feedback", methods=["POST"])
 def handle_feedback():
     data = request.json
@@ -65,6 +115,37 @@ def handle_feedback():
         }
         return jsonify(result), 400
 
+MAX_FEEDBACK_BATCH = 1000
+
+@app.route("/feedback/batch", methods=["POST"])
+def handle_feedback_batch():
+    data = request.json
+    ratings = data.get("feedback") if isinstance(data, dict) else None
+
+    if not isinstance(ratings, list) or not ratings:
+        return jsonify({"error": "No feedback provided"}), 400
+
+    if len(ratings) > MAX_FEEDBACK_BATCH:
+        return jsonify({"error": f"At most {MAX_FEEDBACK_BATCH} ratings per request"}), 400
+
+    invalid = [
+        i for i, rating in enumerate(ratings)
+        if not isinstance(rating, dict)
+        or not rating.get("conversation_id")
+        or rating.get("feedback") not in [1, -1]
+    ]
+    if invalid:
+        return jsonify({"error": "Invalid input", "invalid_items": invalid}), 400
+
+    saved = db.save_feedback_batch(
+            [(rating["conversation_id"], rating["feedback"]) for rating in ratings]
+        )
+
+    if saved is None:
+        return jsonify({"error": "Feedback not saved"}), 400
+
+    return jsonify({"message": f"Feedback received for {saved} conversation(s)", "saved": saved})
+
 if __name__ == "__main__":
     initialize_database()
     app.run(debug=True)
\ No newline at end of file
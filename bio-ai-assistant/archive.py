@@ -0,0 +1,116 @@
+import os
+import argparse
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from dotenv import load_dotenv, find_dotenv
+_ = load_dotenv(find_dotenv())
+
+# Conversations exported by retention.py, one Parquet file per partition.
+relative_path = "../data/archive"
+container_path = "/app/data/archive"
+
+if os.path.exists(os.path.dirname(relative_path)):
+    DEFAULT_ARCHIVE_PATH = relative_path
+else:
+    DEFAULT_ARCHIVE_PATH = container_path
+
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", DEFAULT_ARCHIVE_PATH)
+
+SUMMARY_COLUMNS = ["timestamp", "model_used", "relevance", "response_time", "total_tokens", "gemini_cost"]
+
+
+def archive_dir(path=ARCHIVE_PATH, table="conversations"):
+    return os.path.join(path, table)
+
+
+def open_archive(path=ARCHIVE_PATH):
+    if not os.path.isdir(archive_dir(path)):
+        return None
+    files = sorted(
+        os.path.join(archive_dir(path), name)
+        for name in os.listdir(archive_dir(path))
+        if name.endswith(".parquet")
+    )
+    if not files:
+        return None
+    # Columns added by later migrations are missing from older files, so
+    # read with the union of all file schemas.
+    schema = pa.unify_schemas([pq.read_schema(f) for f in files])
+    return ds.dataset(files, schema=schema, format="parquet")
+
+
+def read_archive(columns=None, start=None, end=None, path=ARCHIVE_PATH):
+    """Read archived conversations as an Arrow table.
+
+    Only the requested columns are decoded, and because every file is sorted
+    by timestamp the start/end filter skips whole row groups using the
+    Parquet min/max statistics.
+    """
+    dataset = open_archive(path)
+    if dataset is None:
+        return None
+
+    condition = None
+    timestamp_type = dataset.schema.field("timestamp").type
+    if start is not None:
+        condition = ds.field("timestamp") >= pa.scalar(start, type=timestamp_type)
+    if end is not None:
+        before_end = ds.field("timestamp") < pa.scalar(end, type=timestamp_type)
+        condition = before_end if condition is None else condition & before_end
+
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def summarize(start=None, end=None, by="month", path=ARCHIVE_PATH):
+    table = read_archive(columns=SUMMARY_COLUMNS, start=start, end=end, path=path)
+    if table is None:
+        return None
+
+    if by == "month":
+        key = pc.strftime(table["timestamp"], format="%Y-%m")
+    elif by == "day":
+        key = pc.strftime(table["timestamp"], format="%Y-%m-%d")
+    else:
+        key = table[by]
+    table = table.append_column("group", key)
+
+    summary = table.group_by("group").aggregate([
+        ("timestamp", "count"),
+        ("response_time", "mean"),
+        ("total_tokens", "sum"),
+        ("gemini_cost", "sum"),
+    ])
+    names = {
+        "group": by,
+        "timestamp_count": "conversations",
+        "response_time_mean": "response_time_avg",
+        "total_tokens_sum": "total_tokens",
+        "gemini_cost_sum": "gemini_cost",
+    }
+    summary = summary.rename_columns([names[name] for name in summary.column_names])
+    summary = summary.select([by, "conversations", "response_time_avg", "total_tokens", "gemini_cost"])
+    return summary.sort_by(by).to_pandas()
+
+
+def parse_date(value):
+    return datetime.fromisoformat(value).astimezone()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query archived conversations")
+    parser.add_argument("--start", type=parse_date, help="Inclusive start, ISO format")
+    parser.add_argument("--end", type=parse_date, help="Exclusive end, ISO format")
+    parser.add_argument("--by", default="month", help="month, day, model_used or relevance")
+    parser.add_argument("--path", default=ARCHIVE_PATH)
+    args = parser.parse_args()
+
+    summary = summarize(start=args.start, end=args.end, by=args.by, path=args.path)
+    if summary is None:
+        print(f"No archived conversations in {archive_dir(args.path)}")
+    else:
+        print(summary.to_string(index=False))
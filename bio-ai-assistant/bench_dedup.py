@@ -0,0 +1,133 @@
+import os
+import argparse
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Only rag's prompt and boosts are needed, so rag must not set up Vertex AI.
+os.environ["LLM_BACKEND"] = "stub"
+
+import dedup
+import ingest
+import minsearch
+import rag
+from evaluate_rag import GROUND_TRUTH_PATH
+from evaluate_retrieval import CHARS_PER_TOKEN
+
+# Measures what near-duplicate removal saves. The sample export has no
+# duplicates, so --duplicates re-adds a share of the papers as "preprints":
+# a few words of the abstract changed and the keywords and affiliations
+# missing. Reports how well clustering finds the injected pairs, the size
+# of the TF-IDF index, and over the ground-truth questions the hit rate,
+# the prompt tokens sent to the LLM and how many of them repeat a paper
+# already in the prompt, with and without deduplication.
+
+
+def near_duplicate(doc, generator, changed_words):
+    words = doc['abstract'].split()
+    for position in generator.choice(len(words), size=min(changed_words, len(words)), replace=False):
+        words[position] = words[generator.integers(len(words))]
+    copy = dict(doc)
+    copy['id'] = f"{doc['id']}-preprint"
+    copy['abstract'] = " ".join(words)
+    copy['keywords'] = ''
+    copy['organization_affiliated'] = ''
+    return copy
+
+
+def inject_duplicates(documents, share, changed_words, seed=1):
+    """Returns the documents plus near-duplicates, and {copy id: original id}."""
+    generator = np.random.default_rng(seed)
+    originals = generator.choice(len(documents), size=int(share * len(documents)), replace=False)
+    copies = [near_duplicate(documents[n], generator, changed_words) for n in originals]
+    return documents + copies, {copy['id']: copy['id'].removesuffix('-preprint') for copy in copies}
+
+
+def clustering_accuracy(documents, injected):
+    clusters = dedup.cluster(documents)
+    cluster_of = {}
+    for n, members in enumerate(clusters):
+        for member in members:
+            cluster_of[documents[member]['id']] = n
+    found = sum(cluster_of[copy] == cluster_of[original] for copy, original in injected.items())
+    merged = len(documents) - len(clusters)
+    return found, merged - found
+
+
+def index_size(index):
+    matrix = index.text_matrix
+    return {
+        'index_mb': (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1e6,
+        'index_nnz': matrix.nnz,
+    }
+
+
+def prompt_stats(index, questions, paper_of, cutoff):
+    hits_found = []
+    prompt_tokens = []
+    repeated_tokens = []
+    for q in questions:
+        hits = index.search(query=q['question'], filter_dict={}, boost_dict=rag.BOOST,
+                            num_results=10, output_scores=True)
+        results = [doc for doc, _ in hits[:rag.cutoff_depth([score for _, score in hits], cutoff)]]
+
+        papers = set()
+        repeated = 0
+        for doc in results:
+            paper = paper_of.get(doc['id'], doc['id'])
+            if paper in papers:
+                repeated += len(rag.entry_template.format(**doc))
+            papers.add(paper)
+            papers.update(paper_of.get(alias, alias) for alias in doc.get('aliases', ()))
+
+        hits_found.append(q['id'] in papers)
+        prompt_tokens.append(len(rag.build_prompt(q['question'], results)) / CHARS_PER_TOKEN)
+        repeated_tokens.append(repeated / CHARS_PER_TOKEN)
+
+    return {
+        'hit_rate': np.mean(hits_found),
+        'prompt_tokens': np.mean(prompt_tokens),
+        'repeated_tokens': np.mean(repeated_tokens),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure near-duplicate removal at ingest")
+    parser.add_argument("--duplicates", type=float, default=0.2,
+                        help="Share of papers re-added as near-duplicates")
+    parser.add_argument("--changed-words", type=int, default=3,
+                        help="Abstract words changed in each near-duplicate")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    documents, injected = inject_duplicates(ingest.load_documents(), args.duplicates, args.changed_words)
+
+    t0 = perf_counter()
+    canonical, aliases = dedup.deduplicate(documents)
+    took = perf_counter() - t0
+    found, spurious = clustering_accuracy(documents, injected)
+    print(f"{len(documents)} documents ({len(injected)} injected near-duplicates) -> "
+          f"{len(canonical)} in {took:.2f} s; {found}/{len(injected)} injected pairs merged, "
+          f"{spurious} other merges")
+
+    questions = pd.read_csv(args.ground_truth)
+    if args.limit:
+        questions = questions.head(args.limit)
+    questions = questions.to_dict(orient='records')
+
+    rows = []
+    for name, corpus in [('all documents', documents), ('deduplicated', canonical)]:
+        index = minsearch.Index(text_fields=ingest.TEXT_FIELDS, keyword_fields=["id"])
+        index.fit(corpus)
+        for cutoff in ('none', 'threshold'):
+            rows.append({
+                'corpus': name,
+                'cutoff': cutoff,
+                'documents': len(corpus),
+                **index_size(index),
+                **prompt_stats(index, questions, injected, cutoff),
+            })
+
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
@@ -0,0 +1,107 @@
+import os
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Shows what retries and hedging do to generate_content tail latency,
+# offline, against the fault-injecting Gemini stub: a share of calls stall
+# (--slow-rate, --slow-latency) and a share fail with 503 (--unavailable-rate).
+# Each policy makes the same number of calls from concurrent clients after a
+# warm-up that fills the latency window the hedge delay is taken from, and
+# the report lists latency percentiles, failed calls and the extra requests
+# the policy sent. Every policy starts with a full hedge budget burst
+# (LLM_HEDGE_BURST), which covers a larger share of a shorter run, so compare
+# budgets over the same --calls.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retries and hedging of Gemini calls")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean stub latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.3, help="Sigma of the lognormal stub latency")
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--unavailable-rate", type=float, default=0.02)
+    parser.add_argument("--budgets", type=float, nargs="+", default=[0.05, 0.1],
+                        help="Hedge budgets to compare")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "STUB_LATENCY": str(args.latency),
+        "STUB_LATENCY_SIGMA": str(args.sigma),
+        "STUB_LATENCY_DISTRIBUTION": "lognormal",
+        "STUB_SLOW_RATE": str(args.slow_rate),
+        "STUB_SLOW_LATENCY": str(args.slow_latency),
+        "STUB_UNAVAILABLE_RATE": str(args.unavailable_rate),
+        # Room for every client's request, its hedge and abandoned requests.
+        "LLM_CALL_THREADS": str(args.concurrency * 4),
+    })
+
+    # Imported late so the stub and thread pool settings above take effect.
+    import admission
+    import gemini_stub
+    import resilience
+
+    policies = [
+        ("single request", resilience.ResilientCaller(max_retries=0, hedging=False)),
+        ("retries", resilience.ResilientCaller(hedging=False, retry_base=0.05, retry_cap=0.5)),
+    ] + [
+        (f"retries + hedging {budget:.0%}",
+         resilience.ResilientCaller(hedging=True, hedge_budget=budget, retry_base=0.05, retry_cap=0.5))
+        for budget in args.budgets
+    ]
+
+    model = gemini_stub.GenerativeModel("gemini-stub")
+    sent = [0]
+    sent_lock = threading.Lock()
+
+    def generate(prompt):
+        with sent_lock:
+            sent[0] += 1
+        return model.generate_content(prompt)
+
+    rows = []
+    for name, caller in policies:
+        # A model name per policy keeps their latency windows apart.
+        model_name = f"gemini-stub-{name}"
+
+        def one_call(_):
+            t0 = perf_counter()
+            try:
+                caller.call(generate, model_name, "QUESTION: test\n\nCONTEXT:\n", stage="bench")
+                return perf_counter() - t0, True
+            except Exception:
+                return perf_counter() - t0, False
+
+        with ThreadPoolExecutor(args.concurrency) as clients:
+            list(clients.map(one_call, range(args.warmup)))
+            before_sent = sent[0]
+            before = dict(admission.metrics)
+            results = list(clients.map(one_call, range(args.calls)))
+
+        latencies = np.array([latency for latency, _ in results]) * 1000
+        counts = {key[0]: value - before.get(key, 0) for key, value in admission.metrics.items() if key[1:] == ("bench",)}
+        rows.append({
+            "policy": name,
+            "p50_ms": np.percentile(latencies, 50),
+            "p95_ms": np.percentile(latencies, 95),
+            "p99_ms": np.percentile(latencies, 99),
+            "p999_ms": np.percentile(latencies, 99.9),
+            "failed": sum(1 for _, ok in results if not ok) / len(results),
+            "extra_requests": (sent[0] - before_sent) / len(results) - 1,
+            "hedged": counts.get("hedged", 0),
+            "hedge_wins": counts.get("hedge_won", 0),
+            "hedges_denied": counts.get("hedge_denied", 0),
+        })
+
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
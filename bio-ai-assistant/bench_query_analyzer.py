@@ -0,0 +1,86 @@
+import os
+import argparse
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Only rag.BOOST is needed, so rag must not set up Vertex AI.
+os.environ["LLM_BACKEND"] = "stub"
+
+import ingest
+from rag import BOOST
+from evaluate_rag import GROUND_TRUTH_PATH
+
+# Compares query analysis through the per-field TfidfVectorizer.transform
+# calls with the index's precompiled term lookup table, over the
+# ground-truth questions. It also checks that both paths give the same
+# scores and the same top results.
+
+
+def time_per_query(function, queries, repeat):
+    times = []
+    for query in queries:
+        t0 = perf_counter()
+        for _ in range(repeat):
+            function(query)
+        times.append((perf_counter() - t0) / repeat)
+    return np.array(times) * 1_000_000
+
+
+def transform_all_fields(index, query):
+    return [index.vectorizers[field].transform([query]) for field in index.text_fields]
+
+
+def lookup_scores(index, query):
+    indices, weights = index.analyze(query)
+    boosts = np.array([BOOST.get(field, 1) for field in index.text_fields])
+    return index.score(indices, weights * boosts[index.column_field[indices]])
+
+
+def top_ids(index, scores, num_results=10):
+    top = np.argsort(-scores, kind='stable')[:num_results]
+    return [index.docs[i]['id'] for i in top if scores[i] > 0]
+
+
+def compare_scores(index, queries):
+    max_diff = 0.0
+    same_top = 0
+    for query in queries:
+        reference = index.score_with_vectorizers(query, BOOST)
+        scores = lookup_scores(index, query)
+        max_diff = max(max_diff, np.abs(reference - scores).max())
+        same_top += top_ids(index, reference) == top_ids(index, scores)
+    return max_diff, same_top
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark query analysis in minsearch")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    queries = pd.read_csv(args.ground_truth)['question'].head(args.limit).tolist()
+    index = ingest.load_index()
+
+    max_diff, same_top = compare_scores(index, queries)
+    print(f"{len(queries)} queries: max score difference {max_diff:.2e}, "
+          f"identical top-10 for {same_top}/{len(queries)}")
+
+    rows = []
+    for name, function in [
+        ('analysis: transform per field', lambda q: transform_all_fields(index, q)),
+        ('analysis: term lookup', index.analyze),
+        ('search: transform per field', lambda q: index.score_with_vectorizers(q, BOOST)),
+        ('search: term lookup', lambda q: lookup_scores(index, q)),
+    ]:
+        times = time_per_query(function, queries, args.repeat)
+        rows.append({
+            'path': name,
+            'us_p50': np.percentile(times, 50),
+            'us_p95': np.percentile(times, 95),
+            'us_mean': times.mean(),
+        })
+
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.1f}"))
@@ -0,0 +1,123 @@
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Only rag.BOOST is needed, so rag must not set up Vertex AI.
+os.environ["LLM_BACKEND"] = "stub"
+
+import ingest
+from rag import BOOST
+
+# Search latency and throughput against the number of shard processes, on a
+# synthetic corpus with the fields of the real dataset. Words follow a Zipf
+# distribution, as in natural text, and every query is a handful of words
+# taken from one of the documents so it has real matches.
+
+
+def make_vocabulary(size, rng):
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    lengths = rng.integers(4, 11, size=size)
+    words = {"".join(rng.choice(letters, n)) for n in lengths}
+    return np.array(sorted(words))
+
+
+def make_text(vocabulary, ranks, lengths):
+    # ranks are Zipf-distributed word ranks for all texts, lengths the
+    # number of words in each text.
+    words = vocabulary[np.minimum(ranks, len(vocabulary)) - 1]
+    ends = np.cumsum(lengths)
+    return [" ".join(words[end - n:end]) for end, n in zip(ends, lengths)]
+
+
+def make_corpus(num_docs, seed=42, vocabulary_size=50_000):
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    names = make_vocabulary(5_000, rng)
+
+    field_lengths = {
+        'abstract': (60, 120),
+        'title': (6, 14),
+        'keywords': (3, 8),
+    }
+    fields = {}
+    for field, (low, high) in field_lengths.items():
+        lengths = rng.integers(low, high, size=num_docs)
+        ranks = rng.zipf(1.1, size=lengths.sum())
+        fields[field] = make_text(vocabulary, ranks, lengths)
+
+    lengths = rng.integers(2, 6, size=num_docs)
+    fields['authors'] = make_text(names, rng.integers(1, len(names) + 1, size=lengths.sum()), lengths)
+    lengths = rng.integers(4, 12, size=num_docs)
+    fields['organization_affiliated'] = make_text(vocabulary, rng.zipf(1.3, size=lengths.sum()), lengths)
+
+    return [
+        {'id': f"doc-{i}", **{field: texts[i] for field, texts in fields.items()}}
+        for i in range(num_docs)
+    ]
+
+
+def make_queries(docs, count, seed=7, words=6):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in rng.integers(0, len(docs), size=count):
+        text = (docs[i]['title'] + " " + docs[i]['abstract']).split()
+        start = rng.integers(0, max(len(text) - words, 1))
+        queries.append(" ".join(text[start:start + words]))
+    return queries
+
+
+def measure(index, queries, concurrency):
+    latencies = []
+    for query in queries:
+        t0 = perf_counter()
+        index.search(query, boost_dict=BOOST, num_results=10)
+        latencies.append(perf_counter() - t0)
+    latencies = np.array(latencies) * 1000
+
+    t0 = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda q: index.search(q, boost_dict=BOOST, num_results=10), queries))
+    throughput = len(queries) / (perf_counter() - t0)
+
+    return {
+        'ms_p50': np.percentile(latencies, 50),
+        'ms_p95': np.percentile(latencies, 95),
+        'ms_p99': np.percentile(latencies, 99),
+        'queries_per_s': throughput,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sharded search on a synthetic corpus")
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4, 8],
+                        help="Shard counts to compare; 0 is the in-process index")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Threads issuing queries in the throughput run")
+    args = parser.parse_args()
+
+    t0 = perf_counter()
+    docs = make_corpus(args.docs)
+    queries = make_queries(docs, args.queries)
+    print(f"Generated {len(docs)} documents in {perf_counter() - t0:.1f}s "
+          f"({os.cpu_count()} CPUs available)")
+
+    rows = []
+    for num_shards in args.shards:
+        t0 = perf_counter()
+        index = ingest.build_index(keyword_fields=["id"], num_shards=num_shards)
+        index.fit(docs)
+        fit_time = perf_counter() - t0
+
+        rows.append({'shards': num_shards, 'fit_s': fit_time, **measure(index, queries, args.concurrency)})
+        print(f"{num_shards} shards: fitted in {fit_time:.1f}s, p50 {rows[-1]['ms_p50']:.2f}ms")
+        if num_shards > 0:
+            index.close()
+        del index
+
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.2f}"))
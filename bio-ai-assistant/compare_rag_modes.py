@@ -0,0 +1,120 @@
+import os
+import re
+import asyncio
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import cohen_kappa_score
+
+from evaluate_rag import REQUESTS_PER_ROW, load_checkpoint, run_evaluation
+
+# Compares the two RAG modes on the questions of the existing evaluation
+# CSVs (data/rag-eval-<model>.csv): "separate", which judges the answer with
+# a second request, and "structured", which returns the answer and a
+# self-assessed relevance label from one request. For each mode it reports
+# latency and gemini_cost, and how often the relevance label agrees with
+# the separate judge's labels in the CSV and in the fresh separate run.
+
+REFERENCE_PATHS = [
+    "../data/rag-eval-gemini-1.5-flash-001.csv",
+    "../data/rag-eval-gemini-1.0-pro.csv",
+]
+if not os.path.exists(REFERENCE_PATHS[0]):
+    REFERENCE_PATHS = [path.replace("../data", "/app/data") for path in REFERENCE_PATHS]
+
+
+def reference_model(path):
+    match = re.search(r"rag-eval-(.+)\.csv$", os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def agreement(labels, reference_labels):
+    merged = pd.merge(labels, reference_labels, on="question", suffixes=("", "_reference"))
+    if merged.empty:
+        return np.nan, np.nan, 0
+    rate = (merged["relevance"] == merged["relevance_reference"]).mean()
+    kappa = cohen_kappa_score(merged["relevance"], merged["relevance_reference"])
+    return rate, kappa, len(merged)
+
+
+def summarize(results, reference, separate):
+    row = {
+        "rows": len(results),
+        "response_time_p50": results["response_time"].median(),
+        "response_time_p95": results["response_time"].quantile(0.95),
+        "tokens_mean": (results["total_tokens"] + results["eval_total_tokens"]).mean(),
+        "gemini_cost_mean": results["gemini_cost"].mean(),
+        "gemini_cost_total": results["gemini_cost"].sum(),
+    }
+    labels = results[["question", "relevance"]]
+    row["agree_csv"], row["kappa_csv"], _ = agreement(labels, reference[["question", "relevance"]])
+    if separate is not None:
+        row["agree_separate"], row["kappa_separate"], _ = agreement(labels, separate[["question", "relevance"]])
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare separate and structured relevance judging")
+    parser.add_argument("--reference", nargs="+", default=REFERENCE_PATHS,
+                        help="Evaluation CSVs whose questions and judge labels are used")
+    parser.add_argument("--output-dir", required=True, help="Directory for the per-mode result CSVs")
+    parser.add_argument("--model", default=None,
+                        help="Model answering the questions; defaults to the one named in each CSV")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=60)
+    parser.add_argument("--max-retries", type=int, default=8)
+    parser.add_argument("--mock", action="store_true",
+                        help="Use the local Gemini stub instead of Vertex AI")
+    args = parser.parse_args()
+
+    if args.mock:
+        os.environ["LLM_BACKEND"] = "stub"
+
+    # Imported late so --mock takes effect before rag sets up its backend.
+    import rag
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = []
+    for path in args.reference:
+        reference = pd.read_csv(path).drop_duplicates("question")
+        if args.limit:
+            reference = reference.head(args.limit)
+        model = args.model or reference_model(path) or rag.MODEL_NAME
+        records = reference[["id", "question"]].to_dict(orient="records")
+
+        results = {}
+        for mode in REQUESTS_PER_ROW:
+            output = os.path.join(
+                args.output_dir, f"{os.path.splitext(os.path.basename(path))[0]}-{mode}.csv"
+            )
+            done = load_checkpoint(output, mode, model)
+            pending = [r for r in records if (r["id"], r["question"]) not in done]
+            print(f"{path}, {mode} mode with {model}: {len(pending)} of {len(records)} questions to run")
+            asyncio.run(run_evaluation(
+                pending,
+                rag_function=lambda question, model, mode=mode: rag.rag(question, model, mode=mode),
+                model=model,
+                output=output,
+                concurrency=args.concurrency,
+                rpm=args.rpm,
+                max_retries=args.max_retries,
+                requests_per_row=REQUESTS_PER_ROW[mode],
+            ))
+            results[mode] = pd.read_csv(output)
+
+        for mode, result in results.items():
+            separate = results["separate"] if mode != "separate" else None
+            rows.append({
+                "reference": os.path.basename(path),
+                "mode": mode,
+                **summarize(result, reference, separate),
+            })
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+
+
+if __name__ == "__main__":
+    main()
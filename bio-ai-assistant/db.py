@@ -1,9 +1,13 @@
 import os
+import math
 import psycopg2
-from psycopg2.extras import DictCursor
+import psycopg2.errors
+from psycopg2.extras import DictCursor, execute_values
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
+import partitions
+
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,96 +17,378 @@ RUN_TIMEZONE_CHECK = os.getenv('RUN_TIMEZONE_CHECK', '1') == '1'
 TZ_INFO = os.getenv("TZ", "Australia/Melbourne")
 tz = ZoneInfo(TZ_INFO)
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv("POSTGRES_HOST", "postgres"),
-        database=os.getenv("POSTGRES_DB", "postgres"),
-        user=os.getenv("POSTGRES_USER", "postgres"),
-        password=os.getenv("POSTGRES_PASSWORD", "postgres"),
-    )
+def connection_params(timeout=None):
+    params = {
+        "host": os.getenv("POSTGRES_HOST", "postgres"),
+        "database": os.getenv("POSTGRES_DB", "postgres"),
+        "user": os.getenv("POSTGRES_USER", "postgres"),
+        "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
+    }
+    # With a timeout (seconds), both connecting and each statement give up
+    # after it. libpq waits at least 2 seconds to connect, and a statement
+    # timeout of 0 would disable it, so both are floored.
+    if timeout is not None:
+        params["connect_timeout"] = max(2, math.ceil(timeout))
+        params["options"] = f"-c statement_timeout={max(1, int(timeout * 1000))}"
+    return params
+
+def get_db_connection(timeout=None):
+    return psycopg2.connect(**connection_params(timeout))
 
 def init_db():
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DROP TABLE IF EXISTS public.feedback")
-            cur.execute("DROP TABLE IF EXISTS public.conversations")
+    # Schema changes are applied in place by versioned migrations, so this is
+    # safe to call on every start: existing conversations and feedback survive.
+    import migrations
+    migrations.apply_migrations()
 
-            cur.execute("""
-                CREATE TABLE public.conversations (
-                    id TEXT PRIMARY KEY,
-                    question TEXT NOT NULL,
-                    answer TEXT NOT NULL,
-                    model_used TEXT NOT NULL,
-                    response_time FLOAT NOT NULL,
-                    relevance TEXT NOT NULL,
-                    relevance_explanation TEXT NOT NULL,
-                    prompt_characters INTEGER NOT NULL,
-                    prompt_tokens INTEGER NOT NULL,
-                    candidates_characters INTEGER NOT NULL,
-                    candidates_tokens INTEGER NOT NULL,
-                    total_tokens INTEGER NOT NULL,
-                    eval_prompt_tokens INTEGER NOT NULL,
-                    eval_candidates_tokens INTEGER NOT NULL,
-                    eval_total_tokens INTEGER NOT NULL,
-                    gemini_cost FLOAT NOT NULL,
-                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL
-                )
-            """)
-            cur.execute("""
-                CREATE TABLE public.feedback (
-                    id SERIAL PRIMARY KEY,
-                    conversation_id TEXT REFERENCES public.conversations(id),
-                    feedback INTEGER NOT NULL,
-                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL
-                )
-            """)
-        conn.commit()
-        print("Database initialized successfully.")
-    except Exception as e:
-        print(f"Error initializing database: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+def create_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.conversations (
+            id TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            model_used TEXT NOT NULL,
+            response_time FLOAT NOT NULL,
+            relevance TEXT NOT NULL,
+            relevance_explanation TEXT NOT NULL,
+            prompt_characters INTEGER NOT NULL,
+            prompt_tokens INTEGER NOT NULL,
+            candidates_characters INTEGER NOT NULL,
+            candidates_tokens INTEGER NOT NULL,
+            total_tokens INTEGER NOT NULL,
+            eval_prompt_tokens INTEGER NOT NULL,
+            eval_candidates_tokens INTEGER NOT NULL,
+            eval_total_tokens INTEGER NOT NULL,
+            gemini_cost FLOAT NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.feedback (
+            id SERIAL PRIMARY KEY,
+            conversation_id TEXT REFERENCES public.conversations(id),
+            feedback INTEGER NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
 
-def save_conversation(conversation_id, question, answer_data, timestamp=None):
-    if timestamp is None:
-        timestamp = datetime.now(tz)
+def create_indexes(cur):
+    # The dashboard and get_recent_conversations filter and sort on timestamp,
+    # and feedback is joined to conversations on conversation_id.
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS conversations_timestamp_idx
+        ON public.conversations (timestamp)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS feedback_conversation_id_idx
+        ON public.feedback (conversation_id)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS feedback_timestamp_idx
+        ON public.feedback (timestamp)
+    """)
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
+def create_rollups(cur):
+    # Per-minute and per-hour aggregates of public.conversations, read by the
+    # Grafana panels instead of scanning the raw table on every refresh.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.conversation_rollups (
+            granularity TEXT NOT NULL,
+            bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+            conversations INTEGER NOT NULL,
+            total_tokens BIGINT NOT NULL,
+            eval_total_tokens BIGINT NOT NULL,
+            gemini_cost FLOAT NOT NULL,
+            response_time_avg FLOAT NOT NULL,
+            response_time_p50 FLOAT NOT NULL,
+            response_time_p95 FLOAT NOT NULL,
+            response_time_p99 FLOAT NOT NULL,
+            response_time_histogram INTEGER[],
+            PRIMARY KEY (granularity, bucket)
+        )
+    """)
+    # Counts broken down by a label column, currently relevance and model_used.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.conversation_label_rollups (
+            granularity TEXT NOT NULL,
+            bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            conversations INTEGER NOT NULL,
+            total_tokens BIGINT NOT NULL,
+            gemini_cost FLOAT NOT NULL,
+            PRIMARY KEY (granularity, bucket, dimension, value)
+        )
+    """)
+    # Lets dashboard panels pick the coarsest rollup that still looks smooth.
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION public.rollup_granularity(
+            time_from TIMESTAMP WITH TIME ZONE,
+            time_to TIMESTAMP WITH TIME ZONE
+        ) RETURNS TEXT AS $$
+            SELECT CASE
+                WHEN time_to - time_from > INTERVAL '1 day' THEN 'hour'
+                ELSE 'minute'
+            END
+        $$ LANGUAGE SQL IMMUTABLE
+    """)
+    create_rollup_histograms(cur)
+
+ROLLUP_GRANULARITIES = ["minute", "hour"]
+ROLLUP_DIMENSIONS = ["relevance", "model_used"]
+
+# Response times are also counted in fixed, log-spaced bins so a bucket's
+# percentiles can be updated on every insert without re-reading its rows.
+# Bin 1 holds answers under HISTOGRAM_MIN_SECONDS, each following bin is
+# HISTOGRAM_GROWTH times wider and the last one is open-ended, which keeps
+# an estimated percentile within about 12% of the exact one.
+HISTOGRAM_BINS = 40
+HISTOGRAM_MIN_SECONDS = 0.05
+HISTOGRAM_GROWTH = 1.25
+
+def create_rollup_histograms(cur):
+    cur.execute("""
+        ALTER TABLE public.conversation_rollups
+        ADD COLUMN IF NOT EXISTS response_time_histogram INTEGER[]
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION public.response_time_bin(seconds FLOAT) RETURNS INTEGER AS $$
+            SELECT LEAST({HISTOGRAM_BINS}, GREATEST(1, 2 + floor(
+                ln(GREATEST(seconds, 1e-6) / {HISTOGRAM_MIN_SECONDS}) / ln({HISTOGRAM_GROWTH})
+            )::INTEGER))
+        $$ LANGUAGE SQL IMMUTABLE
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION public.histogram_add(histogram INTEGER[], seconds FLOAT)
+        RETURNS INTEGER[] AS $$
+            SELECT array_agg(
+                COALESCE(histogram[bin], 0) + (bin = public.response_time_bin(seconds))::INTEGER
+                ORDER BY bin
+            )
+            FROM generate_series(1, {HISTOGRAM_BINS}) AS bin
+        $$ LANGUAGE SQL IMMUTABLE
+    """)
+    # The geometric middle of the bin holding the requested fraction of rows.
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION public.histogram_quantile(histogram INTEGER[], fraction FLOAT)
+        RETURNS FLOAT AS $$
+            SELECT {HISTOGRAM_MIN_SECONDS} * power({HISTOGRAM_GROWTH}, bin - 1.5)
+            FROM (
+                SELECT bin, SUM(histogram[bin]) OVER (ORDER BY bin) AS cumulative
+                FROM generate_series(1, {HISTOGRAM_BINS}) AS bin
+            ) AS bins
+            WHERE cumulative >= fraction * (SELECT SUM(n) FROM unnest(histogram) AS n)
+            ORDER BY bin
+            LIMIT 1
+        $$ LANGUAGE SQL IMMUTABLE
+    """)
+    cur.execute("""
+        CREATE OR REPLACE AGGREGATE public.response_time_histogram(FLOAT) (
+            SFUNC = public.histogram_add,
+            STYPE = INTEGER[]
+        )
+    """)
+
+def refresh_rollups(cur, start=None, end=None):
+    """Recompute every rollup bucket overlapping [start, end].
+
+    New conversations are added to the rollups as they are saved (see
+    add_to_rollups); this rebuilds buckets from the raw rows, with exact
+    percentiles, after a migration or a backfill. With no bounds the whole
+    history is rebuilt.
+    """
+    for granularity in ROLLUP_GRANULARITIES:
+        params = {"granularity": granularity, "start": start, "end": end}
+        # Serialise rebuilds of the same buckets with each other; saves only
+        # take the row locks of the buckets they add to.
+        cur.execute(
+            """
+            SELECT pg_advisory_xact_lock(hashtext('rollup:' || %(granularity)s))
+            """,
+            params,
+        )
+        bounds = """
+            timestamp >= COALESCE(date_trunc(%(granularity)s, %(start)s::timestamptz), '-infinity')
+            AND timestamp < COALESCE(
+                date_trunc(%(granularity)s, %(end)s::timestamptz) + ('1 ' || %(granularity)s)::interval,
+                'infinity'
+            )
+        """
+        cur.execute(
+            f"""
+            INSERT INTO public.conversation_rollups
+            (granularity, bucket, conversations, total_tokens, eval_total_tokens, gemini_cost,
+            response_time_avg, response_time_p50, response_time_p95, response_time_p99,
+            response_time_histogram)
+            SELECT
+                %(granularity)s,
+                date_trunc(%(granularity)s, timestamp) AS bucket,
+                COUNT(*),
+                SUM(total_tokens),
+                SUM(eval_total_tokens),
+                SUM(gemini_cost),
+                AVG(response_time),
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY response_time),
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY response_time),
+                percentile_cont(0.99) WITHIN GROUP (ORDER BY response_time),
+                public.response_time_histogram(response_time)
+            FROM public.conversations
+            WHERE {bounds}
+            GROUP BY bucket
+            ON CONFLICT (granularity, bucket) DO UPDATE SET
+                conversations = EXCLUDED.conversations,
+                total_tokens = EXCLUDED.total_tokens,
+                eval_total_tokens = EXCLUDED.eval_total_tokens,
+                gemini_cost = EXCLUDED.gemini_cost,
+                response_time_avg = EXCLUDED.response_time_avg,
+                response_time_p50 = EXCLUDED.response_time_p50,
+                response_time_p95 = EXCLUDED.response_time_p95,
+                response_time_p99 = EXCLUDED.response_time_p99,
+                response_time_histogram = EXCLUDED.response_time_histogram
+            """,
+            params,
+        )
+        for dimension in ROLLUP_DIMENSIONS:
+            cur.execute(
+                f"""
+                INSERT INTO public.conversation_label_rollups
+                (granularity, bucket, dimension, value, conversations, total_tokens, gemini_cost)
+                SELECT
+                    %(granularity)s,
+                    date_trunc(%(granularity)s, timestamp) AS bucket,
+                    %(dimension)s,
+                    {dimension},
+                    COUNT(*),
+                    SUM(total_tokens),
+                    SUM(gemini_cost)
+                FROM public.conversations
+                WHERE {bounds}
+                GROUP BY bucket, {dimension}
+                ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET
+                    conversations = EXCLUDED.conversations,
+                    total_tokens = EXCLUDED.total_tokens,
+                    gemini_cost = EXCLUDED.gemini_cost
+                """,
+                {**params, "dimension": dimension},
+            )
+
+def add_to_rollups(cur, answer_data, timestamp):
+    """Count one new conversation in its minute and hour rollup buckets.
+
+    Runs in the insert's transaction. Every counter is added to in place, so
+    concurrent writers only wait on the row lock of their own buckets, and
+    the percentiles are re-estimated from the bucket's histogram.
+    """
+    params = {
+        "timestamp": timestamp,
+        "response_time": answer_data["response_time"],
+        "total_tokens": answer_data["total_tokens"],
+        "eval_total_tokens": answer_data["eval_total_tokens"],
+        "gemini_cost": answer_data["gemini_cost"],
+    }
+    histogram = "public.histogram_add(r.response_time_histogram, EXCLUDED.response_time_avg)"
+    for granularity in ROLLUP_GRANULARITIES:
+        params["granularity"] = granularity
+        cur.execute(
+            f"""
+            INSERT INTO public.conversation_rollups AS r
+            (granularity, bucket, conversations, total_tokens, eval_total_tokens, gemini_cost,
+            response_time_avg, response_time_p50, response_time_p95, response_time_p99,
+            response_time_histogram)
+            VALUES (
+                %(granularity)s, date_trunc(%(granularity)s, %(timestamp)s::timestamptz),
+                1, %(total_tokens)s, %(eval_total_tokens)s, %(gemini_cost)s,
+                %(response_time)s, %(response_time)s, %(response_time)s, %(response_time)s,
+                public.histogram_add(NULL, %(response_time)s)
+            )
+            ON CONFLICT (granularity, bucket) DO UPDATE SET
+                conversations = r.conversations + 1,
+                total_tokens = r.total_tokens + EXCLUDED.total_tokens,
+                eval_total_tokens = r.eval_total_tokens + EXCLUDED.eval_total_tokens,
+                gemini_cost = r.gemini_cost + EXCLUDED.gemini_cost,
+                response_time_avg = r.response_time_avg
+                    + (EXCLUDED.response_time_avg - r.response_time_avg) / (r.conversations + 1),
+                response_time_p50 = public.histogram_quantile({histogram}, 0.5),
+                response_time_p95 = public.histogram_quantile({histogram}, 0.95),
+                response_time_p99 = public.histogram_quantile({histogram}, 0.99),
+                response_time_histogram = {histogram}
+            """,
+            params,
+        )
+        for dimension in ROLLUP_DIMENSIONS:
             cur.execute(
                 """
-                INSERT INTO public.conversations
-                (id, question, answer, model_used, response_time, relevance,
-                relevance_explanation, prompt_characters, prompt_tokens, candidates_characters, candidates_tokens, total_tokens,
-                eval_prompt_tokens, eval_candidates_tokens, eval_total_tokens, gemini_cost, timestamp)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO public.conversation_label_rollups AS r
+                (granularity, bucket, dimension, value, conversations, total_tokens, gemini_cost)
+                VALUES (
+                    %(granularity)s, date_trunc(%(granularity)s, %(timestamp)s::timestamptz),
+                    %(dimension)s, %(value)s, 1, %(total_tokens)s, %(gemini_cost)s
+                )
+                ON CONFLICT (granularity, bucket, dimension, value) DO UPDATE SET
+                    conversations = r.conversations + 1,
+                    total_tokens = r.total_tokens + EXCLUDED.total_tokens,
+                    gemini_cost = r.gemini_cost + EXCLUDED.gemini_cost
                 """,
-                (
-                    conversation_id,
-                    question,
-                    answer_data["answer"],
-                    answer_data["model_used"],
-                    answer_data["response_time"],
-                    answer_data["relevance"],
-                    answer_data["relevance_explanation"],
-                    answer_data["prompt_characters"],
-                    answer_data["prompt_tokens"],
-                    answer_data["candidates_characters"],
-                    answer_data["candidates_tokens"],
-                    answer_data["total_tokens"],
-                    answer_data["eval_prompt_tokens"],
-                    answer_data["eval_candidates_tokens"],
-                    answer_data["eval_total_tokens"],
-                    answer_data["gemini_cost"],
-                    timestamp
-                ),
+                {**params, "dimension": dimension, "value": answer_data[dimension]},
             )
+
+def insert_conversation(cur, conversation_id, question, answer_data, timestamp):
+    cur.execute(
+        """
+        INSERT INTO public.conversations
+        (id, question, answer, model_used, response_time, relevance,
+        relevance_explanation, prompt_characters, prompt_tokens, candidates_characters, candidates_tokens, total_tokens,
+        eval_prompt_tokens, eval_candidates_tokens, eval_total_tokens, gemini_cost,
+        routing_reason, routing_time, timestamp)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        (
+            conversation_id,
+            question,
+            answer_data["answer"],
+            answer_data["model_used"],
+            answer_data["response_time"],
+            answer_data["relevance"],
+            answer_data["relevance_explanation"],
+            answer_data["prompt_characters"],
+            answer_data["prompt_tokens"],
+            answer_data["candidates_characters"],
+            answer_data["candidates_tokens"],
+            answer_data["total_tokens"],
+            answer_data["eval_prompt_tokens"],
+            answer_data["eval_candidates_tokens"],
+            answer_data["eval_total_tokens"],
+            answer_data["gemini_cost"],
+            answer_data.get("routing_reason"),
+            answer_data.get("routing_time"),
+            timestamp
+        ),
+    )
+
+def save_conversation(conversation_id, question, answer_data, timestamp=None, timeout=None):
+    if timestamp is None:
+        timestamp = datetime.now(tz)
+
+    try:
+        conn = get_db_connection(timeout=timeout)
+    except psycopg2.Error as error:
+        print(f"Error saving conversation: {error}")
+        return False
+
+    try:
+        try:
+            with conn.cursor() as cur:
+                insert_conversation(cur, conversation_id, question, answer_data, timestamp)
+                add_to_rollups(cur, answer_data, timestamp)
+        except psycopg2.errors.CheckViolation:
+            # No partition covers this timestamp yet: create it and retry once.
+            conn.rollback()
+            with conn.cursor() as cur:
+                partitions.create_partition(cur, timestamp)
+                insert_conversation(cur, conversation_id, question, answer_data, timestamp)
+                add_to_rollups(cur, answer_data, timestamp)
         conn.commit()
         print("Conversation saved successfully.")
-        return True  # Return True to indicate successful save
     except (Exception, psycopg2.Error) as error:
         # Log the error or handle it as needed
         print(f"Error saving conversation: {error}")
@@ -110,24 +396,54 @@ def save_conversation(conversation_id, question, answer_data, timestamp=None):
     finally:
         conn.close()
 
+    return True  # Return True to indicate successful save
+
 def save_feedback(conversation_id, feedback, timestamp=None):
+    saved = save_feedback_batch([(conversation_id, feedback)], timestamp=timestamp)
+    return saved == 1
+
+def save_feedback_batch(ratings, timestamp=None):
+    """Upsert many (conversation_id, feedback) ratings in one statement.
+
+    Each conversation keeps a single feedback row holding its latest rating;
+    ratings for unknown conversations are ignored. Returns the number of rows
+    saved, or None if the statement failed.
+    """
     if timestamp is None:
         timestamp = datetime.now(tz)
 
+    # ON CONFLICT cannot touch the same row twice in one statement, so only
+    # the last rating per conversation in the batch is sent.
+    latest = {conversation_id: feedback for conversation_id, feedback in ratings}
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO public.feedback (conversation_id, feedback, timestamp) VALUES (%s, %s, COALESCE(%s, CURRENT_TIMESTAMP))",
-                (conversation_id, feedback, timestamp),
+            rows = execute_values(
+                cur,
+                """
+                INSERT INTO public.feedback (conversation_id, feedback, timestamp)
+                SELECT v.conversation_id, v.feedback, v.timestamp
+                FROM (VALUES %s) AS v (conversation_id, feedback, timestamp)
+                WHERE EXISTS (
+                    SELECT 1 FROM public.conversations c WHERE c.id = v.conversation_id
+                )
+                ON CONFLICT (conversation_id) DO UPDATE SET
+                    feedback = EXCLUDED.feedback,
+                    timestamp = EXCLUDED.timestamp
+                RETURNING conversation_id
+                """,
+                [(conversation_id, feedback, timestamp) for conversation_id, feedback in latest.items()],
+                template="(%s, %s::integer, %s::timestamptz)",
+                fetch=True,
             )
         conn.commit()
-        print("Feedback saved successfully.")
-        return True  # Return True to indicate successful save
+        print(f"Feedback saved successfully for {len(rows)} conversation(s).")
+        return len(rows)
     except (Exception, psycopg2.Error) as error:
         # Log the error or handle it as needed
         print(f"Error saving feedback: {error}")
-        return False  # Return False to indicate an error occurred
+        return None
     finally:
         conn.close()
 
@@ -135,29 +451,34 @@ def get_recent_conversations(limit=5, relevance=None):
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=DictCursor) as cur:
+            # feedback holds at most one row per conversation, so the join
+            # never duplicates conversations or eats into the LIMIT.
             query = """
                 SELECT c.*, f.feedback
                 FROM public.conversations c
                 LEFT JOIN public.feedback f ON c.id = f.conversation_id
             """
+            params = []
             if relevance:
-                query += f" WHERE c.relevance = '{relevance}'"
+                query += " WHERE c.relevance = %s"
+                params.append(relevance)
             query += " ORDER BY c.timestamp DESC LIMIT %s"
+            params.append(limit)
 
-            cur.execute(query, (limit,))
+            cur.execute(query, params)
             return cur.fetchall()
     finally:
         conn.close()
 
 def get_feedback_stats():
+    # Counters are kept up to date by a trigger on public.feedback.
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=DictCursor) as cur:
             cur.execute("""
-                SELECT
-                    SUM(CASE WHEN feedback > 0 THEN 1 ELSE 0 END) as thumbs_up,
-                    SUM(CASE WHEN feedback < 0 THEN 1 ELSE 0 END) as thumbs_down
-                FROM public.feedback
+                SELECT thumbs_up, thumbs_down
+                FROM public.feedback_stats
+                WHERE id = 1
             """)
             return cur.fetchone()
     finally:
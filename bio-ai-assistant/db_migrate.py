@@ -0,0 +1,18 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+os.environ['RUN_TIMEZONE_CHECK'] = '0'
+
+import migrations
+
+load_dotenv()
+
+if __name__ == "__main__":
+    if "--status" in sys.argv:
+        for version, name, applied in migrations.migration_status():
+            state = "applied" if applied else "pending"
+            print(f"{version:>4}  {state:<8} {name}")
+    else:
+        print("Migrating database...")
+        migrations.apply_migrations()
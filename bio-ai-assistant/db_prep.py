@@ -9,4 +9,11 @@ load_dotenv()
 
 if __name__ == "__main__":
     print("Initializing database...")
-    init_db()
\ No newline at end of file
+    init_db()
+
+    # The postgres search backend reads the corpus from public.documents.
+    if os.getenv("SEARCH_BACKEND", "minsearch") == "postgres":
+        import ingest
+        import pg_search
+        count = pg_search.load_documents(ingest.load_documents())
+        print(f"Loaded {count} documents into public.documents")
@@ -0,0 +1,131 @@
+import re
+import zlib
+import itertools
+from collections import defaultdict
+
+import numpy as np
+
+# Near-duplicate detection for the corpus, run before indexing. Exports often
+# hold the same paper more than once (preprint and published version,
+# errata) with near-identical abstracts. Each paper's title and abstract are
+# cut into word shingles and summarised by a MinHash signature; signatures
+# are split into LSH bands, and papers sharing a band bucket become
+# candidate pairs. A pair whose estimated Jaccard similarity reaches the
+# threshold is merged, so clustering takes roughly linear time instead of
+# comparing every pair. Each cluster keeps one canonical paper, which lists
+# the ids of the others in "aliases".
+
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+DEDUP_THRESHOLD = 0.8
+
+# MinHash permutations are h(x) = (a * x + b) mod MERSENNE_PRIME; with
+# 31-bit operands the product fits in 64 bits.
+MERSENNE_PRIME = (1 << 31) - 1
+MAX_HASH = MERSENNE_PRIME - 1
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Hashes of the overlapping word n-grams of text, lower-cased."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        generator = np.random.default_rng(seed)
+        self.a = generator.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = generator.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        if len(hashes) == 0:
+            return np.full(len(self.a), MAX_HASH, dtype=np.uint64)
+        x = (hashes % MERSENNE_PRIME)[:, None]
+        return ((self.a * x + self.b) % MERSENNE_PRIME).min(axis=0)
+
+
+def lsh_parameters(threshold, num_perm=NUM_PERM):
+    """(bands, rows) with bands * rows == num_perm for an LSH threshold.
+
+    Two documents of Jaccard similarity s share a bucket with probability
+    1 - (1 - s ** rows) ** bands, an S-curve rising around
+    (1 / bands) ** (1 / rows). The most rows whose midpoint is still below
+    the threshold catch nearly every pair at the threshold; candidates
+    below it are dropped when verified.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) < threshold]
+    return max(below, key=lambda option: option[1]) if below else options[0]
+
+
+def candidate_pairs(signatures, bands, rows):
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for n, signature in enumerate(signatures):
+            buckets[signature[band * rows:(band + 1) * rows].tobytes()].append(n)
+        for members in buckets.values():
+            pairs.update(itertools.combinations(members, 2))
+    return pairs
+
+
+def find(parents, n):
+    while parents[n] != n:
+        parents[n] = parents[parents[n]]
+        n = parents[n]
+    return n
+
+
+def cluster(documents, threshold=DEDUP_THRESHOLD, num_perm=NUM_PERM):
+    """Groups near-duplicate documents; returns lists of document positions."""
+    hasher = MinHasher(num_perm)
+    signatures = np.array([
+        hasher.signature(shingles(f"{doc.get('title', '')} {doc.get('abstract', '')}"))
+        for doc in documents
+    ])
+    bands, rows = lsh_parameters(threshold, num_perm)
+
+    parents = list(range(len(documents)))
+    for i, j in candidate_pairs(signatures, bands, rows):
+        # The share of equal MinHash values estimates the Jaccard similarity.
+        if np.mean(signatures[i] == signatures[j]) >= threshold:
+            parents[find(parents, j)] = find(parents, i)
+
+    clusters = defaultdict(list)
+    for n in range(len(documents)):
+        clusters[find(parents, n)].append(n)
+    return list(clusters.values())
+
+
+def completeness(doc):
+    # The most complete record of a cluster is kept: most filled-in fields,
+    # then the longest abstract, then the smallest id for a stable choice.
+    filled = sum(1 for value in doc.values() if value)
+    return (-filled, -len(doc.get('abstract') or ''), str(doc.get('id')))
+
+
+def deduplicate(documents, threshold=DEDUP_THRESHOLD, num_perm=NUM_PERM):
+    """Returns (canonical documents, {alias id: canonical id}).
+
+    Canonical documents are copies with an "aliases" list naming the ids of
+    the near-duplicates they stand for; documents without duplicates are
+    returned unchanged.
+    """
+    canonical = []
+    aliases = {}
+    # Clusters come in order of their first member, so the corpus order,
+    # which decides ties in the index, is kept.
+    for members in sorted(cluster(documents, threshold, num_perm)):
+        docs = sorted((documents[n] for n in members), key=completeness)
+        if len(docs) == 1:
+            canonical.append(docs[0])
+            continue
+        keep = dict(docs[0])
+        keep['aliases'] = [doc['id'] for doc in docs[1:]]
+        for doc in docs[1:]:
+            aliases[doc['id']] = keep['id']
+        canonical.append(keep)
+    return canonical, aliases
@@ -0,0 +1,263 @@
+import os
+import csv
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+import numpy as np
+import pandas as pd
+
+import resilience
+from resilience import backoff_delay, is_retryable
+
+# Offline LLM-as-a-judge evaluation of the RAG flow over the ground-truth
+# questions, as in notebooks/rag-test-gemini.ipynb, but run by a bounded pool
+# of concurrent workers under a requests-per-minute budget. Every finished
+# row is appended to the output CSV straight away, and rerunning the same
+# command skips rows that are already there. The mode and model a CSV was
+# written with are kept next to it, and a rerun with others is refused.
+
+relative_path = "../data/ground-truth-retrieval.csv"
+container_path = "/app/data/ground-truth-retrieval.csv"
+
+if os.path.exists(relative_path):
+    GROUND_TRUTH_PATH = relative_path
+else:
+    GROUND_TRUTH_PATH = container_path
+
+OUTPUT_COLUMNS = [
+    "answer", "id", "question", "relevance", "explanation",
+    "model_used", "response_time", "total_tokens", "eval_total_tokens", "gemini_cost",
+]
+
+# Every row makes two generate_content requests, the answer and the judge,
+# or one in the structured single-call mode.
+REQUESTS_PER_ROW = {"separate": 2, "structured": 1}
+
+class TokenBucket:
+    """Async token bucket allowing `rate_per_minute` requests, with bursts up
+    to `capacity`. Callers wait until enough tokens have accumulated."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or max(1, rate_per_minute / 60)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        async with self.lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+def load_questions(path=GROUND_TRUTH_PATH, per_id=1, seed=42, limit=None):
+    # The sample is seeded, so a resumed run sees exactly the same questions.
+    df = pd.read_csv(path)
+    df = df.groupby("id").sample(n=per_id, random_state=seed).reset_index(drop=True)
+    if limit:
+        df = df.head(limit)
+    return df.to_dict(orient="records")
+
+
+def load_checkpoint(path, mode, model):
+    """Return the (id, question) pairs already in path.
+
+    Raises ValueError when path holds rows of another mode or model, so a
+    rerun never skips questions it has not answered or mixes results.
+    """
+    settings = {"mode": mode, "model": model}
+    settings_path = f"{path}.settings.json"
+    if os.path.exists(settings_path):
+        with open(settings_path, encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous != settings:
+            raise ValueError(
+                f"{path} was written in {previous['mode']} mode with {previous['model']}, "
+                f"not {mode} mode with {model}; choose another output file"
+            )
+
+    done = set()
+    if os.path.exists(path):
+        rows = pd.read_csv(path)
+        # Checkpoints from before the settings file only record the model.
+        other_models = set(rows["model_used"].dropna()) - {model}
+        if other_models:
+            raise ValueError(f"{path} has answers from {', '.join(sorted(other_models))}, not {model}")
+        done = set(zip(rows["id"], rows["question"]))
+
+    with open(settings_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+    return done
+
+
+class CheckpointWriter:
+    def __init__(self, path):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_COLUMNS)
+        if new_file:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+async def evaluate_record(record, rag_function, model, bucket, executor, max_retries, requests_per_row):
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        await bucket.acquire(requests_per_row)
+        try:
+            return await loop.run_in_executor(executor, rag_function, record["question"], model)
+        except Exception as e:
+            if not is_retryable(e) or attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Retryable error ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def run_evaluation(records, rag_function, model, output, concurrency, rpm, max_retries,
+                         requests_per_row=REQUESTS_PER_ROW["separate"]):
+    # Rows are retried by evaluate_record, which charges every attempt to the
+    # bucket, so the requests rag sends itself (retries, hedges) are turned
+    # off to keep the runner within --rpm.
+    resilience.caller.max_retries = 0
+    resilience.caller.hedging = False
+    bucket = TokenBucket(rpm, capacity=max(requests_per_row, rpm / 60))
+    queue = asyncio.Queue()
+    for record in records:
+        queue.put_nowait(record)
+
+    writer = CheckpointWriter(output)
+    latencies = []
+    failures = 0
+
+    async def worker(executor):
+        nonlocal failures
+        while True:
+            try:
+                record = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = monotonic()
+            try:
+                answer_data = await evaluate_record(
+                    record, rag_function, model, bucket, executor, max_retries, requests_per_row
+                )
+            except Exception as e:
+                failures += 1
+                print(f"Failed on question {record['question']!r}: {e}")
+                continue
+            latencies.append(monotonic() - t0)
+            writer.write({
+                "answer": answer_data["answer"],
+                "id": record["id"],
+                "question": record["question"],
+                "relevance": answer_data["relevance"],
+                "explanation": answer_data["relevance_explanation"],
+                "model_used": answer_data["model_used"],
+                "response_time": answer_data["response_time"],
+                "total_tokens": answer_data["total_tokens"],
+                "eval_total_tokens": answer_data["eval_total_tokens"],
+                "gemini_cost": answer_data["gemini_cost"],
+            })
+            done = len(latencies)
+            if done % 10 == 0:
+                print(f"{done}/{len(records)} rows evaluated")
+
+    t0 = monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        await asyncio.gather(*(worker(executor) for _ in range(concurrency)))
+    elapsed = monotonic() - t0
+    writer.close()
+
+    return {
+        "rows": len(latencies),
+        "failures": failures,
+        "elapsed": elapsed,
+        "latencies": latencies,
+    }
+
+
+def print_report(stats, output):
+    print(f"Evaluated {stats['rows']} rows ({stats['failures']} failed) in {stats['elapsed']:.1f}s")
+    if stats["rows"]:
+        latencies = np.array(stats["latencies"])
+        print(f"Throughput: {stats['rows'] / stats['elapsed']:.2f} rows/s")
+        print(
+            "Row time incl. rate-limit waits p50/p95/p99: "
+            f"{np.percentile(latencies, 50):.2f}s / {np.percentile(latencies, 95):.2f}s / "
+            f"{np.percentile(latencies, 99):.2f}s"
+        )
+
+    df = pd.read_csv(output)
+    print(f"\nRelevance in {output} ({len(df)} rows):")
+    print(df["relevance"].value_counts().to_string())
+    print(f"Total gemini_cost: {df['gemini_cost'].sum():.6f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline RAG evaluation")
+    parser.add_argument("--output", required=True, help="CSV file to append results to")
+    parser.add_argument("--model", default=None, help="Model answering the questions")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH)
+    parser.add_argument("--per-id", type=int, default=1, help="Questions sampled per document")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=60,
+                        help="generate_content requests per minute allowed by the Vertex quota")
+    parser.add_argument("--max-retries", type=int, default=8)
+    parser.add_argument("--mode", default="separate", choices=list(REQUESTS_PER_ROW),
+                        help="Judge with a second request, or self-assess in one structured request")
+    parser.add_argument("--mock", action="store_true",
+                        help="Use the local Gemini stub instead of Vertex AI")
+    args = parser.parse_args()
+
+    if args.mock:
+        os.environ["LLM_BACKEND"] = "stub"
+
+    # Imported late so --mock takes effect before rag sets up its backend.
+    import rag
+
+    model = args.model or rag.MODEL_NAME
+    records = load_questions(args.ground_truth, per_id=args.per_id, seed=args.seed, limit=args.limit)
+    try:
+        done = load_checkpoint(args.output, args.mode, model)
+    except ValueError as e:
+        parser.error(str(e))
+    pending = [r for r in records if (r["id"], r["question"]) not in done]
+    print(f"{len(records)} questions, {len(records) - len(pending)} already in {args.output}")
+
+    stats = asyncio.run(run_evaluation(
+        pending,
+        rag_function=lambda question, model: rag.rag(question, model, mode=args.mode),
+        model=model,
+        output=args.output,
+        concurrency=args.concurrency,
+        rpm=args.rpm,
+        max_retries=args.max_retries,
+        requests_per_row=REQUESTS_PER_ROW[args.mode],
+    ))
+    print_report(stats, args.output)
+
+
+if __name__ == "__main__":
+    main()
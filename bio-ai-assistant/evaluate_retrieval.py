@@ -0,0 +1,150 @@
+import os
+import re
+import argparse
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Retrieval evaluation never calls the LLM, so rag must not set up Vertex AI.
+os.environ["LLM_BACKEND"] = "stub"
+
+import ingest
+import rag
+from evaluate_rag import GROUND_TRUTH_PATH
+
+# Hit rate and MRR over data/ground-truth-retrieval.csv, the metrics reported
+# in the README, together with the size and Gemini cost of the prompt each
+# retrieval mode would send to the LLM and the time spent searching.
+
+CHARS_PER_TOKEN = 4
+
+
+def hit_rate(relevance_total):
+    cnt = 0
+
+    for line in relevance_total:
+        if True in line:
+            cnt = cnt + 1
+
+    return cnt / len(relevance_total)
+
+
+def mrr(relevance_total):
+    total_score = 0.0
+
+    for line in relevance_total:
+        for rank in range(len(line)):
+            if line[rank] == True:
+                total_score = total_score + 1 / (rank + 1)
+
+    return total_score / len(relevance_total)
+
+
+def evaluate(ground_truth, search_function):
+    relevance_total = []
+    prompt_characters = []
+    prompt_costs = []
+    num_results = []
+    search_times = []
+
+    for q in ground_truth:
+        t0 = perf_counter()
+        results = search_function(q['question'])
+        search_times.append(perf_counter() - t0)
+
+        # A canonical document also answers for the duplicates it replaced.
+        relevance_total.append([d['id'] == q['id'] or q['id'] in d.get('aliases', ()) for d in results])
+        prompt = rag.build_prompt(q['question'], results)
+        prompt_characters.append(len(prompt))
+        # Gemini bills non-whitespace characters; only the prompt side is known here.
+        prompt_costs.append(rag.calculate_gemini_cost(rag.MODEL_NAME, {
+            'prompt_characters': len(re.sub(r"\s", "", prompt)),
+            'candidates_characters': 0,
+        }))
+        num_results.append(len(results))
+
+    prompt_characters = np.array(prompt_characters)
+    search_times = np.array(search_times) * 1000
+    return {
+        'hit_rate': hit_rate(relevance_total),
+        'mrr': mrr(relevance_total),
+        'results': np.mean(num_results),
+        'prompt_characters': prompt_characters.mean(),
+        'prompt_tokens': prompt_characters.mean() / CHARS_PER_TOKEN,
+        'prompt_cost_per_1k': np.mean(prompt_costs) * 1000,
+        'search_ms_p50': np.percentile(search_times, 50),
+        'search_ms_p95': np.percentile(search_times, 95),
+    }
+
+
+def document_search(cutoff="none", deduplicate=False):
+    index = ingest.load_index(deduplicate=deduplicate)
+
+    def search(query):
+        hits = index.search(
+            query=query, filter_dict={}, boost_dict=rag.BOOST, num_results=10, output_scores=True
+        )
+        depth = rag.cutoff_depth([score for _, score in hits], cutoff)
+        return [doc for doc, _ in hits[:depth]]
+
+    return search
+
+
+def passage_search(aggregation, cutoff="none"):
+    index = ingest.load_passage_index()
+
+    def search(query):
+        papers = rag.search_passages(index, query, num_results=10, aggregation=aggregation)
+        return papers[:rag.cutoff_depth([paper['score'] for paper in papers], cutoff)]
+
+    return search
+
+
+def postgres_search(ranking):
+    # Imported here so the other modes run without a database. Loads the
+    # corpus into public.documents first; rows are upserted, so this is
+    # safe to repeat.
+    import pg_search
+    pg_search.load_documents(ingest.load_documents())
+    index = pg_search.PostgresIndex(ranking=ranking)
+
+    def search(query):
+        return index.search(query=query, filter_dict={}, boost_dict=rag.BOOST, num_results=10)
+
+    return search
+
+
+SEARCH_MODES = {
+    'document': document_search,
+    'document-threshold': lambda: document_search(cutoff='threshold'),
+    'document-gap': lambda: document_search(cutoff='gap'),
+    'document-dedup': lambda: document_search(deduplicate=True),
+    'passage-max': lambda: passage_search('max'),
+    'passage-sum': lambda: passage_search('sum'),
+    'passage-max-threshold': lambda: passage_search('max', cutoff='threshold'),
+    'passage-max-gap': lambda: passage_search('max', cutoff='gap'),
+    'postgres': lambda: postgres_search('ts_rank'),
+    'postgres-cover-density': lambda: postgres_search('ts_rank_cd'),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate retrieval on the ground-truth questions")
+    parser.add_argument("--modes", nargs="+", default=list(SEARCH_MODES), choices=list(SEARCH_MODES))
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    ground_truth = pd.read_csv(args.ground_truth)
+    if args.limit:
+        ground_truth = ground_truth.head(args.limit)
+    ground_truth = ground_truth.to_dict(orient='records')
+
+    rows = []
+    for mode in args.modes:
+        print(f"Evaluating {mode} on {len(ground_truth)} questions...")
+        rows.append({'mode': mode, **evaluate(ground_truth, SEARCH_MODES[mode]())})
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
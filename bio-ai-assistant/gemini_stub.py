@@ -0,0 +1,180 @@
+import os
+import re
+import json
+import math
+import random
+import hashlib
+import threading
+from collections import deque
+from time import sleep, time
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+# A local stand-in for vertexai.generative_models.GenerativeModel. It answers
+# with text lifted from the prompt's CONTEXT, judges with a deterministic
+# label and reports token usage the way the real API does, so the RAG flow,
+# evaluation runner and benchmarks can run without network access or quota.
+
+# Mean generate_content latency in seconds. By default it is drawn from a
+# lognormal with the given sigma so there is a realistic tail;
+# STUB_LATENCY_DISTRIBUTION can also be "exponential", "uniform" (between 0
+# and twice the mean) or "constant".
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.5"))
+STUB_LATENCY_SIGMA = float(os.getenv("STUB_LATENCY_SIGMA", "0.5"))
+STUB_LATENCY_DISTRIBUTION = os.getenv("STUB_LATENCY_DISTRIBUTION", "lognormal")
+STUB_COUNT_TOKENS_LATENCY = float(os.getenv("STUB_COUNT_TOKENS_LATENCY", "0.02"))
+# Fraction of generate_content calls that fail with a quota error.
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+# Fault injection: the fraction of calls that fail with 503 Service
+# Unavailable, and the fraction that stall for STUB_SLOW_LATENCY seconds on
+# top of their usual latency, like a request stuck on a busy backend.
+STUB_UNAVAILABLE_RATE = float(os.getenv("STUB_UNAVAILABLE_RATE", "0"))
+STUB_SLOW_RATE = float(os.getenv("STUB_SLOW_RATE", "0"))
+STUB_SLOW_LATENCY = float(os.getenv("STUB_SLOW_LATENCY", str(10 * STUB_LATENCY)))
+# generate_content requests per minute allowed before quota errors, 0 = no limit.
+STUB_RPM = int(os.getenv("STUB_RPM", "0"))
+
+CHARS_PER_TOKEN = 4
+
+# Names of the Vertex AI Schema.Type enum. A dict generation_config is turned
+# into the API's GenerationConfig, which looks types up by these names, so
+# JSON-schema spellings such as "object" fail there with a KeyError.
+SCHEMA_TYPES = ("STRING", "NUMBER", "INTEGER", "BOOLEAN", "ARRAY", "OBJECT")
+
+_request_times = deque()
+_request_lock = threading.Lock()
+
+
+class CountTokensResponse:
+    def __init__(self, text):
+        self.total_tokens = math.ceil(len(text) / CHARS_PER_TOKEN)
+        self.total_billable_characters = len(re.sub(r"\s", "", text))
+
+
+class UsageMetadata:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = CountTokensResponse(prompt).total_tokens
+        self.candidates_token_count = CountTokensResponse(text).total_tokens
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class GenerationResponse:
+    def __init__(self, prompt, text):
+        self.text = text
+        self.usage_metadata = UsageMetadata(prompt, text)
+
+
+def sample_latency(mean=STUB_LATENCY, sigma=STUB_LATENCY_SIGMA, distribution=STUB_LATENCY_DISTRIBUTION):
+    if mean <= 0:
+        return 0.0
+    if distribution == "constant":
+        return mean
+    if distribution == "exponential":
+        return random.expovariate(1 / mean)
+    if distribution == "uniform":
+        return random.uniform(0, 2 * mean)
+    if distribution == "lognormal":
+        mu = math.log(mean) - sigma ** 2 / 2
+        return random.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown STUB_LATENCY_DISTRIBUTION: {distribution}")
+
+
+def check_quota():
+    if STUB_RPM <= 0:
+        return
+    now = time()
+    with _request_lock:
+        while _request_times and _request_times[0] <= now - 60:
+            _request_times.popleft()
+        if len(_request_times) >= STUB_RPM:
+            raise ResourceExhausted("Quota exceeded for generate_content requests per minute (stub)")
+        _request_times.append(now)
+
+
+def stable_fraction(text):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def answer_question(prompt):
+    question = re.search(r"QUESTION: (.*)", prompt)
+    abstract = re.search(r"abstract: (.*)", prompt)
+    title = re.search(r"title: (.*)", prompt)
+
+    if abstract is None:
+        return "The provided context does not contain information to answer this question.\n"
+
+    sentences = re.split(r"(?<=[.!?])\s+", abstract.group(1).strip())
+    summary = " ".join(sentences[:2])
+    source = f' The study "{title.group(1).strip()}" reports:' if title else ""
+    topic = question.group(1).strip() if question else "The question"
+    return f"{topic}{source} {summary}\n"
+
+
+def judge_answer(prompt):
+    question = re.search(r"Question: (.*)", prompt)
+    key = question.group(1) if question else prompt
+    fraction = stable_fraction(key)
+    if fraction < 0.7:
+        relevance = "RELEVANT"
+    elif fraction < 0.95:
+        relevance = "PARTLY_RELEVANT"
+    else:
+        relevance = "NON_RELEVANT"
+    return json.dumps({
+        "Relevance": relevance,
+        "Explanation": f"Stub evaluation: the answer was judged {relevance}.",
+    }, indent=2)
+
+
+def answer_and_judge(prompt):
+    # The structured single-call response: the answer plus the same
+    # deterministic label the separate judge would give for the question.
+    question = re.search(r"QUESTION: (.*)", prompt)
+    judged = json.loads(judge_answer(f"Question: {question.group(1) if question else prompt}"))
+    return json.dumps({
+        "answer": answer_question(prompt),
+        "relevance": judged["Relevance"],
+        "explanation": judged["Explanation"],
+    })
+
+
+def check_schema(schema):
+    """Raises KeyError for a schema type Vertex AI would not accept."""
+    if "type" in schema and schema["type"] not in SCHEMA_TYPES:
+        raise KeyError(schema["type"])
+    for field in schema.get("properties", {}).values():
+        check_schema(field)
+    if "items" in schema:
+        check_schema(schema["items"])
+
+
+class GenerativeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def count_tokens(self, contents):
+        if STUB_COUNT_TOKENS_LATENCY > 0:
+            sleep(STUB_COUNT_TOKENS_LATENCY)
+        return CountTokensResponse(contents)
+
+    def generate_content(self, contents, generation_config=None):
+        if generation_config and "response_schema" in generation_config:
+            check_schema(generation_config["response_schema"])
+        check_quota()
+        latency = sample_latency()
+        if random.random() < STUB_SLOW_RATE:
+            latency += STUB_SLOW_LATENCY
+        sleep(latency)
+        if random.random() < STUB_ERROR_RATE:
+            raise ResourceExhausted("Quota exceeded (stub fault injection)")
+        if random.random() < STUB_UNAVAILABLE_RATE:
+            raise ServiceUnavailable("Service Unavailable (stub fault injection)")
+
+        if generation_config and "response_schema" in generation_config:
+            text = answer_and_judge(contents)
+        elif "Generated Answer:" in contents:
+            text = judge_answer(contents)
+        else:
+            text = answer_question(contents)
+        return GenerationResponse(contents, text)
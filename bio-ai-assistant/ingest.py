@@ -1,7 +1,10 @@
 import os
+import re
 import pandas as pd
 
+import dedup
 import minsearch
+import sharding
 
 from dotenv import load_dotenv, find_dotenv
 _ = load_dotenv(find_dotenv())
@@ -15,21 +18,92 @@ else:
     DATA_PATH = container_path
 
 
-def load_index(data_path=DATA_PATH):
-    df = pd.read_json(data_path, lines=True)
+TEXT_FIELDS = [
+    'abstract', 
+    'authors', 
+    'keywords', 
+    'organization_affiliated', 
+    'title'
+]
+
+# Passage mode splits each abstract into windows of PASSAGE_SENTENCES
+# sentences, starting every PASSAGE_STRIDE sentences so neighbouring windows
+# overlap and no statement is cut off at a window edge.
+PASSAGE_SENTENCES = 3
+PASSAGE_STRIDE = 2
+
 
+def load_documents(data_path=DATA_PATH, deduplicate=False):
+    df = pd.read_json(data_path, lines=True)
     documents = df.to_dict(orient="records")
 
-    index = minsearch.Index(
-        text_fields=[
-            'abstract', 
-            'authors', 
-            'keywords', 
-            'organization_affiliated', 
-            'title'
-        ],
-        keyword_fields=["id"],
+    # Near-duplicate papers are collapsed into one canonical document whose
+    # "aliases" list the ids it replaces.
+    if deduplicate:
+        canonical, aliases = dedup.deduplicate(documents)
+        print(f"Deduplicated {len(documents)} documents into {len(canonical)} ({len(aliases)} aliases)")
+        documents = canonical
+
+    return documents
+
+
+def build_index(keyword_fields, num_shards=0):
+    # With num_shards > 0 the documents are spread over that many shard
+    # processes that are searched in parallel.
+    if num_shards > 0:
+        return sharding.ShardedIndex(
+            text_fields=TEXT_FIELDS,
+            keyword_fields=keyword_fields,
+            num_shards=num_shards,
+        )
+
+    return minsearch.Index(
+        text_fields=TEXT_FIELDS,
+        keyword_fields=keyword_fields,
     )
 
+
+def load_index(data_path=DATA_PATH, num_shards=0, deduplicate=False):
+    documents = load_documents(data_path, deduplicate=deduplicate)
+
+    index = build_index(keyword_fields=["id"], num_shards=num_shards)
+
     index.fit(documents)
-    return index
\ No newline at end of file
+    return index
+
+
+def split_sentences(text):
+    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z0-9(])', text.strip())
+    return [sentence for sentence in sentences if sentence]
+
+
+def split_passages(doc, sentences=PASSAGE_SENTENCES, stride=PASSAGE_STRIDE):
+    """Split a paper into overlapping passages of its abstract.
+
+    Each passage carries the paper's other fields unchanged, so field boosts
+    apply exactly as for whole documents, plus a parent_id pointing back to
+    the paper. The passage text takes the place of the abstract.
+    """
+    abstract_sentences = split_sentences(doc.get('abstract', ''))
+    starts = range(0, max(len(abstract_sentences) - sentences, 0) + 1, stride)
+    if starts[-1] + sentences < len(abstract_sentences):
+        starts = list(starts) + [len(abstract_sentences) - sentences]
+
+    passages = []
+    for n, start in enumerate(starts):
+        passage = dict(doc)
+        passage['id'] = f"{doc['id']}-{n}"
+        passage['parent_id'] = doc['id']
+        passage['abstract'] = " ".join(abstract_sentences[start:start + sentences])
+        passages.append(passage)
+    return passages
+
+
+def load_passage_index(data_path=DATA_PATH, num_shards=0, deduplicate=False):
+    documents = load_documents(data_path, deduplicate=deduplicate)
+    passages = [passage for doc in documents for passage in split_passages(doc)]
+
+    index = build_index(keyword_fields=["id", "parent_id"], num_shards=num_shards)
+
+    index.fit(passages)
+    return index
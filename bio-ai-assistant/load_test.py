@@ -0,0 +1,303 @@
+import os
+import sys
+import random
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+import numpy as np
+import pandas as pd
+import requests
+
+from evaluate_rag import GROUND_TRUTH_PATH
+
+# Open-loop load test of the /question and /feedback endpoints. Questions
+# from the ground-truth CSV arrive as a Poisson process at each of the given
+# rates, whether or not earlier requests have finished, and a share of the
+# answered questions is followed by a feedback rating. Latency is measured
+# from the scheduled arrival time, so time spent waiting for a free client
+# thread counts too. Postgres connections and commits are sampled while the
+# test runs.
+#
+# With --start-server the app is started under gunicorn with LLM_BACKEND=stub
+# and the given stub latency distribution, so the test needs no network
+# access and different worker counts are easy to compare.
+
+DEFAULT_URL = "http://localhost:5000"
+
+DB_ACTIVITY_QUERY = """
+    SELECT
+        count(*) FILTER (WHERE state = 'active'),
+        count(*) FILTER (WHERE state = 'idle in transaction'),
+        count(*) FILTER (WHERE wait_event_type = 'Lock'),
+        count(*),
+        current_setting('max_connections')::int
+    FROM pg_stat_activity
+    WHERE datname = current_database() AND pid <> pg_backend_pid()
+"""
+
+DB_COMMITS_QUERY = """
+    SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database()
+"""
+
+
+class DbMonitor(threading.Thread):
+    """Samples Postgres connection states and the transaction rate every `interval` seconds."""
+
+    def __init__(self, interval=1.0):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        # db is imported here so the test runs without Postgres, and without
+        # its import-time timezone check, which writes and deletes a row.
+        os.environ["RUN_TIMEZONE_CHECK"] = "0"
+        try:
+            import db
+            conn = db.get_db_connection()
+            conn.autocommit = True
+        except Exception as e:
+            print(f"Database monitoring disabled: {e}")
+            return
+
+        previous = None
+        try:
+            with conn.cursor() as cur:
+                while not self.stopped.is_set():
+                    t = perf_counter()
+                    cur.execute(DB_ACTIVITY_QUERY)
+                    active, idle_in_transaction, lock_waits, connections, max_connections = cur.fetchone()
+                    cur.execute(DB_COMMITS_QUERY)
+                    transactions = cur.fetchone()[0]
+                    if previous is not None:
+                        self.samples.append({
+                            "active": active,
+                            "idle_in_transaction": idle_in_transaction,
+                            "lock_waits": lock_waits,
+                            "connections": connections,
+                            "max_connections": max_connections,
+                            "transactions_per_s": (transactions - previous[1]) / (t - previous[0]),
+                        })
+                    previous = (t, transactions)
+                    self.stopped.wait(self.interval)
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        samples = self.samples
+        self.samples = []
+        return samples
+
+
+def arrival_times(rate, duration, rng):
+    # Poisson arrivals: exponential gaps between requests.
+    times = []
+    t = rng.expovariate(rate)
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rate)
+    return times
+
+
+def post(url, payload, timeout):
+    try:
+        response = requests.post(url, json=payload, timeout=timeout)
+        return response.status_code, response
+    except requests.RequestException as e:
+        return None, e
+
+
+def run_step(base_url, questions, rate, duration, feedback_ratio, timeout, max_in_flight, rng):
+    results = []
+    results_lock = threading.Lock()
+
+    def record(endpoint, scheduled, status, error=None):
+        with results_lock:
+            results.append({
+                "endpoint": endpoint,
+                "rate": rate,
+                "latency": perf_counter() - scheduled,
+                "completed": perf_counter() - start,
+                "status": status,
+                "error": error,
+            })
+
+    def ask(scheduled, question, send_feedback, feedback):
+        status, response = post(f"{base_url}/question", {"question": question}, timeout)
+        error = None if status == 200 else str(response)[:200] if status is None else response.text[:200]
+        record("question", scheduled, status, error)
+        if status != 200 or not send_feedback:
+            return
+
+        conversation_id = response.json().get("conversation_id")
+        sent = perf_counter()
+        status, response = post(
+            f"{base_url}/feedback", {"conversation_id": conversation_id, "feedback": feedback}, timeout
+        )
+        error = None if status == 200 else str(response)[:200] if status is None else response.text[:200]
+        record("feedback", sent, status, error)
+
+    arrivals = arrival_times(rate, duration, rng)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        start = perf_counter()
+        for offset in arrivals:
+            delay = start + offset - perf_counter()
+            if delay > 0:
+                sleep(delay)
+            executor.submit(
+                ask,
+                start + offset,
+                rng.choice(questions),
+                rng.random() < feedback_ratio,
+                rng.choice([1, -1]),
+            )
+
+    return results
+
+
+def summarize(rate, duration, results, db_samples):
+    df = pd.DataFrame(results)
+    row = {"offered_per_s": rate}
+
+    questions = df[df["endpoint"] == "question"] if len(df) else df
+    ok = questions[questions["status"] == 200] if len(questions) else questions
+    elapsed = max(duration, df["completed"].max()) if len(df) else duration
+    row["questions"] = len(questions)
+    row["answered_per_s"] = len(ok) / elapsed
+    row["question_errors"] = 1 - len(ok) / len(questions) if len(questions) else 0.0
+
+    for endpoint, name in [("question", "q"), ("feedback", "fb")]:
+        subset = df[(df["endpoint"] == endpoint) & (df["status"] == 200)] if len(df) else df
+        latencies = subset["latency"].to_numpy() * 1000 if len(subset) else np.array([np.nan])
+        for p in (50, 95, 99):
+            row[f"{name}_p{p}_ms"] = np.percentile(latencies, p)
+
+    feedback = df[df["endpoint"] == "feedback"] if len(df) else df
+    row["feedback_errors"] = (feedback["status"] != 200).mean() if len(feedback) else 0.0
+
+    if db_samples:
+        samples = pd.DataFrame(db_samples)
+        row["db_active_max"] = samples["active"].max()
+        row["db_lock_waits_max"] = samples["lock_waits"].max()
+        row["db_conn_used_max"] = (samples["connections"] / samples["max_connections"]).max()
+        row["db_xact_per_s"] = samples["transactions_per_s"].mean()
+
+    return row
+
+
+def wait_until_ready(base_url, timeout):
+    # An empty question is rejected with a 400 as soon as a worker has loaded
+    # the app and its index.
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        status, _ = post(f"{base_url}/question", {"question": ""}, timeout=5)
+        if status == 400:
+            return True
+        sleep(0.5)
+    return False
+
+
+def start_server(args):
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "stub",
+        "STUB_LATENCY": str(args.stub_latency),
+        "STUB_LATENCY_SIGMA": str(args.stub_latency_sigma),
+        "STUB_LATENCY_DISTRIBUTION": args.stub_distribution,
+        "STUB_ERROR_RATE": str(args.stub_error_rate),
+    }
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--bind", f"127.0.0.1:{args.port}",
+        "--workers", str(args.workers),
+        "--threads", str(args.threads),
+        "--timeout", str(int(args.timeout) + 30),
+        "app:app",
+    ]
+    print(f"Starting: {' '.join(command)}")
+    server = subprocess.Popen(command, env=env)
+    if not wait_until_ready(f"http://127.0.0.1:{args.port}", timeout=300):
+        server.terminate()
+        raise RuntimeError("The app did not start listening in time")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of the question and feedback endpoints")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 5, 10],
+                        help="Question arrival rates to test, in requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per rate")
+    parser.add_argument("--warmup", type=float, default=10,
+                        help="Seconds of load at the first rate before measuring, not reported")
+    parser.add_argument("--feedback-ratio", type=float, default=0.3,
+                        help="Share of answered questions followed by a feedback rating")
+    parser.add_argument("--timeout", type=float, default=60, help="Client timeout per request")
+    parser.add_argument("--max-in-flight", type=int, default=256,
+                        help="Client threads; arrivals beyond this wait and their wait counts as latency")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="CSV file for every request's result")
+
+    server = parser.add_argument_group("local server")
+    server.add_argument("--start-server", action="store_true",
+                        help="Start the app under gunicorn with the Gemini stub")
+    server.add_argument("--workers", type=int, default=1)
+    server.add_argument("--threads", type=int, default=1)
+    server.add_argument("--port", type=int, default=5050)
+    server.add_argument("--stub-latency", type=float, default=0.5)
+    server.add_argument("--stub-latency-sigma", type=float, default=0.5)
+    server.add_argument("--stub-distribution", default="lognormal",
+                        choices=["lognormal", "exponential", "uniform", "constant"])
+    server.add_argument("--stub-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.url.rstrip("/")
+    if args.start_server:
+        process = start_server(args)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    questions = pd.read_csv(args.ground_truth)["question"].tolist()
+    rng = random.Random(args.seed)
+
+    rows = []
+    all_results = []
+    try:
+        if args.warmup > 0:
+            print(f"Warming up at {args.rates[0]} questions/s for {args.warmup}s...")
+            run_step(
+                base_url, questions, args.rates[0], args.warmup, args.feedback_ratio,
+                args.timeout, args.max_in_flight, rng,
+            )
+
+        for rate in args.rates:
+            print(f"Offering {rate} questions/s for {args.duration}s...")
+            monitor = DbMonitor()
+            monitor.start()
+            results = run_step(
+                base_url, questions, rate, args.duration, args.feedback_ratio,
+                args.timeout, args.max_in_flight, rng,
+            )
+            rows.append(summarize(rate, args.duration, results, monitor.stop()))
+            all_results.extend(results)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        pd.DataFrame(all_results).to_csv(args.output, index=False)
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+from datetime import timedelta
+
+import psycopg2
+
+import db
+import partitions
+
+# Every schema change is a numbered migration applied at most once, in order,
+# and recorded in public.schema_migrations. Migrations only ever change the
+# schema in place: they must never drop or rewrite data the app still needs.
+
+# Arbitrary key for the advisory lock that stops several app workers from
+# migrating the same database at the same time.
+MIGRATION_LOCK_ID = 720_026_027
+
+BACKFILL_BATCH_SIZE = 1000
+CATCH_UP_MARGIN = timedelta(hours=1)
+
+
+def create_base_tables(conn):
+    with conn.cursor() as cur:
+        db.create_tables(cur)
+
+
+def create_dashboard_rollups(conn):
+    with conn.cursor() as cur:
+        db.create_indexes(cur)
+        db.create_rollups(cur)
+        db.refresh_rollups(cur)
+
+
+def partition_conversations(conn):
+    """Turn public.conversations into a table range-partitioned by timestamp.
+
+    Rows are copied into the new table in batches while the old one keeps
+    serving traffic; only the final catch-up and rename hold a lock. The old
+    table is kept as public.conversations_unpartitioned rather than dropped.
+    """
+    with conn.cursor() as cur:
+        if partitions.is_partitioned(cur):
+            return
+
+        # A primary key on a partitioned table must include the partition
+        # key, so (id) alone can no longer be referenced by a foreign key.
+        cur.execute("""
+            ALTER TABLE public.feedback
+            DROP CONSTRAINT IF EXISTS feedback_conversation_id_fkey
+        """)
+        cur.execute("DROP TABLE IF EXISTS public.conversations_partitioned")
+        cur.execute("""
+            CREATE TABLE public.conversations_partitioned (
+                LIKE public.conversations INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+            ) PARTITION BY RANGE (timestamp)
+        """)
+        cur.execute("""
+            ALTER TABLE public.conversations_partitioned
+            ADD CONSTRAINT conversations_partitioned_pkey PRIMARY KEY (id, timestamp)
+        """)
+        cur.execute("""
+            CREATE INDEX conversations_partitioned_timestamp_idx
+            ON public.conversations_partitioned (timestamp)
+        """)
+
+        cur.execute("SELECT MIN(timestamp), MAX(timestamp) FROM public.conversations")
+        first, last = cur.fetchone()
+        if first is not None:
+            partitions.create_partitions(
+                cur, first, last, parent="conversations_partitioned"
+            )
+    conn.commit()
+
+    watermark = copy_in_batches(
+        conn,
+        source="public.conversations",
+        target="public.conversations_partitioned",
+    )
+
+    with conn.cursor() as cur:
+        # Writers are blocked from here to the commit, readers are not.
+        cur.execute("LOCK TABLE public.conversations IN EXCLUSIVE MODE")
+        cur.execute("SELECT MAX(timestamp) FROM public.conversations")
+        last = cur.fetchone()[0]
+        if last is not None:
+            partitions.create_partitions(
+                cur, last, last, parent="conversations_partitioned"
+            )
+        # Re-scan a margin behind the watermark: a request that started
+        # earlier may have committed its row after that batch was copied.
+        if watermark is not None:
+            watermark = (watermark[0] - CATCH_UP_MARGIN, "")
+        copy_batch(
+            cur,
+            source="public.conversations",
+            target="public.conversations_partitioned",
+            after=watermark,
+            limit=None,
+        )
+
+        cur.execute("ALTER TABLE public.conversations RENAME TO conversations_unpartitioned")
+        cur.execute("""
+            ALTER TABLE public.conversations_unpartitioned
+            RENAME CONSTRAINT conversations_pkey TO conversations_unpartitioned_pkey
+        """)
+        cur.execute("""
+            ALTER INDEX IF EXISTS public.conversations_timestamp_idx
+            RENAME TO conversations_unpartitioned_timestamp_idx
+        """)
+
+        cur.execute("ALTER TABLE public.conversations_partitioned RENAME TO conversations")
+        cur.execute("""
+            ALTER TABLE public.conversations
+            RENAME CONSTRAINT conversations_partitioned_pkey TO conversations_pkey
+        """)
+        cur.execute("""
+            ALTER INDEX public.conversations_partitioned_timestamp_idx
+            RENAME TO conversations_timestamp_idx
+        """)
+        for name, _ in partitions.list_partitions(cur):
+            if name.startswith("conversations_partitioned_"):
+                new_name = name.replace("conversations_partitioned_", "conversations_", 1)
+                cur.execute(f"ALTER TABLE public.{name} RENAME TO {new_name}")
+
+        partitions.ensure_upcoming_partitions(cur)
+
+
+def copy_batch(cur, source, target, after=None, limit=BACKFILL_BATCH_SIZE):
+    # Rows are walked in (timestamp, id) order; returns the last key copied.
+    where = ""
+    params = []
+    if after is not None:
+        where = "WHERE (timestamp, id) > (%s, %s)"
+        params.extend(after)
+    limit_clause = ""
+    if limit is not None:
+        limit_clause = "LIMIT %s"
+        params.append(limit)
+
+    cur.execute(
+        f"""
+        WITH batch AS (
+            SELECT * FROM {source}
+            {where}
+            ORDER BY timestamp, id
+            {limit_clause}
+        ), copied AS (
+            INSERT INTO {target}
+            SELECT * FROM batch
+            ON CONFLICT DO NOTHING
+        )
+        SELECT timestamp, id FROM batch
+        ORDER BY timestamp DESC, id DESC
+        LIMIT 1
+        """,
+        params,
+    )
+    return cur.fetchone()
+
+
+def copy_in_batches(conn, source, target, batch_size=BACKFILL_BATCH_SIZE):
+    # Each batch commits on its own so no long transaction holds back vacuum.
+    watermark = None
+    while True:
+        with conn.cursor() as cur:
+            last = copy_batch(cur, source, target, after=watermark, limit=batch_size)
+        conn.commit()
+        if last is None:
+            return watermark
+        watermark = last
+
+
+def add_column_with_backfill(conn, table, column, definition, backfill, batch_size=BACKFILL_BATCH_SIZE):
+    """Add a column and fill it for existing rows without a long table lock.
+
+    The column is added as nullable, which is a catalog-only change, and
+    historical rows are updated in small committed batches using the SQL
+    expression backfill. Like copy_batch, the batches walk the table in
+    (timestamp, id) order from a watermark, so each one starts where the
+    last stopped instead of rescanning the rows already filled. Run it again
+    after an interruption: rows that are no longer NULL are skipped.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE public.{table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+    conn.commit()
+
+    watermark = None
+    while True:
+        where = ""
+        params = []
+        if watermark is not None:
+            where = "WHERE (timestamp, id) > (%s, %s)"
+            params.extend(watermark)
+        params.append(batch_size)
+
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                WITH batch AS (
+                    SELECT timestamp AS batch_timestamp, id AS batch_id
+                    FROM public.{table}
+                    {where}
+                    ORDER BY timestamp, id
+                    LIMIT %s
+                ), filled AS (
+                    UPDATE public.{table} SET {column} = {backfill}
+                    FROM batch
+                    WHERE timestamp = batch_timestamp AND id = batch_id
+                    AND {column} IS NULL
+                )
+                SELECT batch_timestamp, batch_id FROM batch
+                ORDER BY batch_timestamp DESC, batch_id DESC
+                LIMIT 1
+                """,
+                params,
+            )
+            last = cur.fetchone()
+        conn.commit()
+        if last is None:
+            return
+        watermark = last
+
+
+def feedback_upsert_and_stats(conn):
+    """Keep one feedback row per conversation and O(1) thumbs up/down stats."""
+    with conn.cursor() as cur:
+        # Keep only the latest rating of each conversation.
+        cur.execute("""
+            DELETE FROM public.feedback f
+            USING public.feedback g
+            WHERE f.conversation_id = g.conversation_id
+            AND (f.timestamp, f.id) < (g.timestamp, g.id)
+        """)
+        cur.execute("DROP INDEX IF EXISTS public.feedback_conversation_id_idx")
+        cur.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS feedback_conversation_id_key
+            ON public.feedback (conversation_id)
+        """)
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS public.feedback_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                thumbs_up BIGINT NOT NULL,
+                thumbs_down BIGINT NOT NULL
+            )
+        """)
+        cur.execute("""
+            INSERT INTO public.feedback_stats (id, thumbs_up, thumbs_down)
+            SELECT
+                1,
+                COUNT(*) FILTER (WHERE feedback > 0),
+                COUNT(*) FILTER (WHERE feedback < 0)
+            FROM public.feedback
+            ON CONFLICT (id) DO UPDATE SET
+                thumbs_up = EXCLUDED.thumbs_up,
+                thumbs_down = EXCLUDED.thumbs_down
+        """)
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION public.update_feedback_stats() RETURNS trigger AS $$
+            DECLARE
+                up_delta INTEGER := 0;
+                down_delta INTEGER := 0;
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    up_delta := up_delta - (OLD.feedback > 0)::int;
+                    down_delta := down_delta - (OLD.feedback < 0)::int;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    up_delta := up_delta + (NEW.feedback > 0)::int;
+                    down_delta := down_delta + (NEW.feedback < 0)::int;
+                END IF;
+                IF up_delta <> 0 OR down_delta <> 0 THEN
+                    UPDATE public.feedback_stats
+                    SET thumbs_up = thumbs_up + up_delta,
+                        thumbs_down = thumbs_down + down_delta
+                    WHERE id = 1;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS feedback_stats_trigger ON public.feedback")
+        cur.execute("""
+            CREATE TRIGGER feedback_stats_trigger
+            AFTER INSERT OR UPDATE OF feedback OR DELETE ON public.feedback
+            FOR EACH ROW EXECUTE FUNCTION public.update_feedback_stats()
+        """)
+
+
+def create_answer_flights(conn):
+    """Answers of finished single-flight computations, read by waiting workers."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS public.answer_flights (
+                key TEXT PRIMARY KEY,
+                answer_data JSONB NOT NULL,
+                completed_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+        """)
+
+
+def add_routing_columns(conn):
+    """Record why each conversation's model was chosen and how long that took."""
+    # Conversations before routing always used the one configured model.
+    add_column_with_backfill(conn, "conversations", "routing_reason", "TEXT", "'fixed'")
+    with conn.cursor() as cur:
+        cur.execute("ALTER TABLE public.conversations ADD COLUMN IF NOT EXISTS routing_time FLOAT")
+
+
+def create_documents(conn):
+    """The paper corpus with a weighted full-text vector, for pg_search."""
+    # Postgres has four rank weights, so the fields are grouped by their
+    # rag.BOOST: abstract (A), organization_affiliated (B), keywords (C),
+    # title and authors (D). pg_search.WEIGHT_LABELS mirrors this.
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS public.documents (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL DEFAULT '',
+                abstract TEXT NOT NULL DEFAULT '',
+                authors TEXT NOT NULL DEFAULT '',
+                keywords TEXT NOT NULL DEFAULT '',
+                organization_affiliated TEXT NOT NULL DEFAULT '',
+                search_vector TSVECTOR GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english', abstract), 'A') ||
+                    setweight(to_tsvector('english', organization_affiliated), 'B') ||
+                    setweight(to_tsvector('english', keywords), 'C') ||
+                    setweight(to_tsvector('english', title), 'D') ||
+                    setweight(to_tsvector('english', authors), 'D')
+                ) STORED
+            )
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS documents_search_vector_idx
+            ON public.documents USING GIN (search_vector)
+        """)
+
+
+def add_rollup_histograms(conn):
+    """Response-time histograms, so saves can update the rollups in place."""
+    with conn.cursor() as cur:
+        db.create_rollup_histograms(cur)
+        db.refresh_rollups(cur)
+
+
+MIGRATIONS = [
+    (1, "create base tables", create_base_tables),
+    (2, "dashboard indexes and rollups", create_dashboard_rollups),
+    (3, "partition conversations by timestamp", partition_conversations),
+    (4, "feedback upsert and stats", feedback_upsert_and_stats),
+    (5, "single-flight answers", create_answer_flights),
+    (6, "model routing columns", add_routing_columns),
+    (7, "full-text searchable documents", create_documents),
+    (8, "rollup response-time histograms", add_rollup_histograms),
+]
+
+
+def create_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def get_applied_versions(cur):
+    cur.execute("SELECT version FROM public.schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_migrations(conn=None):
+    close = conn is None
+    if conn is None:
+        conn = db.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            create_migrations_table(cur)
+            applied = get_applied_versions(cur)
+        conn.commit()
+
+        for version, name, migration in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f"Applying migration {version}: {name}")
+            migration(conn)
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO public.schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+            conn.commit()
+
+        with conn.cursor() as cur:
+            if partitions.is_partitioned(cur):
+                partitions.ensure_upcoming_partitions(cur)
+        conn.commit()
+        print("Database initialized successfully.")
+    except (Exception, psycopg2.Error) as e:
+        print(f"Error initializing database: {e}")
+        conn.rollback()
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        if close:
+            conn.close()
+
+
+def migration_status(conn=None):
+    close = conn is None
+    if conn is None:
+        conn = db.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            create_migrations_table(cur)
+            applied = get_applied_versions(cur)
+        conn.commit()
+        return [(version, name, version in applied) for version, name, _ in MIGRATIONS]
+    finally:
+        if close:
+            conn.close()
@@ -1,7 +1,10 @@
+from collections import Counter
+
 import pandas as pd
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 
 import numpy as np
 
@@ -15,7 +18,9 @@ class Index:
         keyword_fields (list): List of keyword field names to index.
         vectorizers (dict): Dictionary of TfidfVectorizer instances for each text field.
         keyword_df (pd.DataFrame): DataFrame containing keyword field data.
-        text_matrices (dict): Dictionary of TF-IDF matrices for each text field.
+        text_matrix (scipy.sparse.csc_matrix): TF-IDF matrices of all text fields side by side, one column block per field.
+        field_slices (dict): Column range of each text field in text_matrix.
+        term_lookup (dict): Maps each term to its column ids in text_matrix and their IDF weights, across all fields.
         docs (list): List of documents indexed.
     """
 
@@ -33,22 +38,50 @@ class Index:
 
         self.vectorizers = {field: TfidfVectorizer(**vectorizer_params) for field in text_fields}
         self.keyword_df = None
-        self.text_matrices = {}
+        self.text_matrix = None
+        self.field_slices = {}
+        self.column_field = None
+        self.term_lookup = None
+        self.analyzer = None
+        self.query_params = None
         self.docs = []
 
-    def fit(self, docs):
+    def fit(self, docs, statistics=None):
         """
         Fits the index with the provided documents.
 
         Args:
             docs (list of dict): List of documents to index. Each document is a dictionary.
+            statistics (dict): Optional vocabulary and IDF weights to use instead of those of docs.
+                Keys are text field names and values are (vocabulary, idf) pairs, e.g. computed over
+                a whole corpus of which docs is one shard.
         """
         self.docs = docs
         keyword_data = {field: [] for field in self.keyword_fields}
 
+        matrices = []
+        offset = 0
         for field in self.text_fields:
             texts = [doc.get(field, '') for doc in docs]
-            self.text_matrices[field] = self.vectorizers[field].fit_transform(texts)
+            vectorizer = self.vectorizers[field]
+            if statistics is None:
+                matrix = vectorizer.fit_transform(texts)
+            else:
+                vocabulary, idf = statistics[field]
+                vectorizer.set_params(vocabulary=vocabulary)
+                vectorizer.idf_ = idf
+                matrix = vectorizer.transform(texts)
+            matrices.append(matrix)
+            self.field_slices[field] = slice(offset, offset + matrix.shape[1])
+            offset += matrix.shape[1]
+
+        # Stored column-major so a query term's postings are one contiguous
+        # slice of the matrix arrays.
+        self.text_matrix = sparse.hstack(matrices, format='csc')
+        self.column_field = np.concatenate([
+            np.full(matrix.shape[1], i) for i, matrix in enumerate(matrices)
+        ])
+        self.build_query_analyzer()
 
         for doc in docs:
             for field in self.keyword_fields:
@@ -58,28 +91,149 @@ class Index:
 
         return self
 
-    def search(self, query, filter_dict={}, boost_dict={}, num_results=10):
+    def build_query_analyzer(self):
         """
-        Searches the index with the given query, filters, and boost parameters.
+        Precomputes a single term lookup table over all text fields so queries can be analyzed without TfidfVectorizer.transform.
+
+        Only vectorizer settings whose query weighting is reproduced exactly are supported; otherwise
+        the lookup table is left empty and search falls back to the vectorizers. That includes
+        norm=None: the plain dot product of unnormalized vectors is not the cosine similarity the
+        reference path computes.
+        """
+        params = [
+            {name: value for name, value in vectorizer.get_params().items() if name != 'vocabulary'}
+            for vectorizer in self.vectorizers.values()
+        ]
+        if not params or any(p != params[0] for p in params) or params[0]['norm'] != 'l2':
+            self.analyzer = None
+            self.term_lookup = None
+            self.query_params = None
+            return
+
+        # All fields share one analyzer, so the query is tokenized once.
+        self.analyzer = next(iter(self.vectorizers.values())).build_analyzer()
+        self.query_params = params[0]
+
+        lookup = {}
+        for field in self.text_fields:
+            vectorizer = self.vectorizers[field]
+            start = self.field_slices[field].start
+            idf = vectorizer.idf_ if vectorizer.use_idf else None
+            for term, column in vectorizer.vocabulary_.items():
+                lookup.setdefault(term, []).append(
+                    (start + column, idf[column] if idf is not None else 1.0)
+                )
+
+        self.term_lookup = {
+            term: (np.array([c for c, _ in entries]), np.array([w for _, w in entries]))
+            for term, entries in lookup.items()
+        }
+
+    def analyze(self, query):
+        """
+        Turns a query into the TF-IDF weights it would get from each field's vectorizer.
 
         Args:
             query (str): The search query string.
-            filter_dict (dict): Dictionary of keyword fields to filter by. Keys are field names and values are the values to filter by.
-            boost_dict (dict): Dictionary of boost scores for text fields. Keys are field names and values are the boost scores.
-            num_results (int): The number of top results to return. Defaults to 10.
 
         Returns:
-            list of dict: List of documents matching the search criteria, ranked by relevance.
+            tuple: (indices, weights) arrays of text_matrix column ids and their query weights,
+            L2-normalized per field like TfidfVectorizer.transform.
+        """
+        params = self.query_params
+        counts = Counter(self.analyzer(query))
+
+        indices = []
+        weights = []
+        for term, count in counts.items():
+            entry = self.term_lookup.get(term)
+            if entry is None:
+                continue
+            if params['binary']:
+                tf = 1.0
+            elif params['sublinear_tf']:
+                tf = 1.0 + np.log(count)
+            else:
+                tf = float(count)
+            indices.append(entry[0])
+            weights.append(entry[1] * tf)
+
+        if not indices:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+        indices = np.concatenate(indices)
+        weights = np.concatenate(weights)
+
+        fields = self.column_field[indices]
+        norms = np.sqrt(np.bincount(fields, weights=weights ** 2, minlength=len(self.text_fields)))
+        weights = weights / norms[fields]
+
+        return indices, weights
+
+    def score(self, indices, weights):
+        """
+        Scores every document against an analyzed query: the sum of weight times TF-IDF value over the query columns.
+
+        Args:
+            indices (np.ndarray): text_matrix column ids from analyze.
+            weights (np.ndarray): Query weight of each column, including any boost.
+
+        Returns:
+            np.ndarray: Score of each indexed document.
+        """
+        indptr = self.text_matrix.indptr
+        starts = indptr[indices]
+        ends = indptr[indices + 1]
+        lengths = ends - starts
+
+        # Positions of every stored value in the query columns, without a
+        # Python loop over the columns.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(lengths.sum())
+        rows = self.text_matrix.indices[positions]
+        values = self.text_matrix.data[positions] * np.repeat(weights, lengths)
+
+        return np.bincount(rows, weights=values, minlength=len(self.docs))
+
+    def score_with_vectorizers(self, query, boost_dict={}):
+        """
+        Scores every document by transforming the query with each field's TfidfVectorizer.
+
+        This is the reference path, used when the lookup table cannot reproduce the vectorizer settings.
         """
-        query_vecs = {field: self.vectorizers[field].transform([query]) for field in self.text_fields}
         scores = np.zeros(len(self.docs))
 
         # Compute cosine similarity for each text field and apply boost
-        for field, query_vec in query_vecs.items():
-            sim = cosine_similarity(query_vec, self.text_matrices[field]).flatten()
+        for field in self.text_fields:
+            query_vec = self.vectorizers[field].transform([query])
+            field_matrix = self.text_matrix[:, self.field_slices[field]]
+            sim = cosine_similarity(query_vec, field_matrix).flatten()
             boost = boost_dict.get(field, 1)
             scores += sim * boost
 
+        return scores
+
+    def search(self, query, filter_dict={}, boost_dict={}, num_results=10, output_scores=False):
+        """
+        Searches the index with the given query, filters, and boost parameters.
+
+        Args:
+            query (str): The search query string.
+            filter_dict (dict): Dictionary of keyword fields to filter by. Keys are field names and values are the values to filter by.
+            boost_dict (dict): Dictionary of boost scores for text fields. Keys are field names and values are the boost scores.
+            num_results (int): The number of top results to return. Defaults to 10.
+            output_scores (bool): If True, return (document, score) pairs instead of documents.
+
+        Returns:
+            list of dict: List of documents matching the search criteria, ranked by relevance.
+        """
+        if self.term_lookup is None:
+            scores = self.score_with_vectorizers(query, boost_dict)
+        else:
+            indices, weights = self.analyze(query)
+            boosts = np.array([boost_dict.get(field, 1) for field in self.text_fields])
+            scores = self.score(indices, weights * boosts[self.column_field[indices]])
+
         # Apply keyword filters
         for field, value in filter_dict.items():
             if field in self.keyword_fields:
@@ -91,6 +245,9 @@ class Index:
         top_indices = top_indices[np.argsort(-scores[top_indices])]
 
         # Filter out zero-score results
+        if output_scores:
+            return [(self.docs[i], scores[i]) for i in top_indices if scores[i] > 0]
+
         top_docs = [self.docs[i] for i in top_indices if scores[i] > 0]
 
-        return top_docs
\ No newline at end of file
+        return top_docs
@@ -0,0 +1,136 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import psycopg2.errors
+
+# public.conversations is range-partitioned on timestamp, one partition per
+# UTC calendar day or month. Partitions are plain tables named
+# conversations_pYYYY_MM_DD or conversations_pYYYY_MM, so old ones can be
+# detached or dropped without rewriting the rest.
+PARENT_TABLE = "conversations"
+PARTITION_INTERVAL = os.getenv("CONVERSATIONS_PARTITION_INTERVAL", "month")
+
+NAME_FORMATS = {
+    "day": "%Y_%m_%d",
+    "month": "%Y_%m",
+}
+
+if PARTITION_INTERVAL not in NAME_FORMATS:
+    raise ValueError(f"Unsupported partition interval: {PARTITION_INTERVAL}")
+
+
+def period_start(timestamp, interval=PARTITION_INTERVAL):
+    # Boundaries are always computed in UTC so partitions never overlap,
+    # whatever time zone the caller's timestamps are in.
+    timestamp = timestamp.astimezone(timezone.utc)
+    start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "month":
+        start = start.replace(day=1)
+    return start
+
+
+def next_period(start, interval=PARTITION_INTERVAL):
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(start, interval=PARTITION_INTERVAL, parent=PARENT_TABLE):
+    return f"{parent}_p{start.strftime(NAME_FORMATS[interval])}"
+
+
+def parse_partition_name(name, parent=PARENT_TABLE):
+    """Return (start, end) of the period a partition covers, from its name."""
+    suffix = name[len(f"{parent}_p"):]
+    for interval, name_format in NAME_FORMATS.items():
+        try:
+            start = datetime.strptime(suffix, name_format).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        return start, next_period(start, interval)
+    raise ValueError(f"Not a {parent} partition: {name}")
+
+
+def is_partitioned(cur, table=PARENT_TABLE):
+    cur.execute(
+        """
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = %s
+        """,
+        (table,),
+    )
+    return cur.fetchone() is not None
+
+
+def create_partition(cur, timestamp, parent=PARENT_TABLE):
+    """Create the partition holding timestamp if it does not exist yet."""
+    start = period_start(timestamp)
+    end = next_period(start)
+    name = partition_name(start, parent=parent)
+    # After switching PARTITION_INTERVAL an older partition may already cover
+    # this period; rows keep going there and no new partition is needed.
+    cur.execute("SAVEPOINT create_partition")
+    try:
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS public.{name}
+            PARTITION OF public.{parent}
+            FOR VALUES FROM (%s) TO (%s)
+            """,
+            (start, end),
+        )
+    except psycopg2.errors.InvalidObjectDefinition:
+        cur.execute("ROLLBACK TO SAVEPOINT create_partition")
+        return None
+    cur.execute("RELEASE SAVEPOINT create_partition")
+    return name
+
+
+def create_partitions(cur, start, end, parent=PARENT_TABLE):
+    """Create every partition overlapping [start, end]."""
+    names = []
+    current = period_start(start)
+    while current <= end:
+        name = create_partition(cur, current, parent=parent)
+        if name is not None:
+            names.append(name)
+        current = next_period(current)
+    return names
+
+
+def ensure_upcoming_partitions(cur, now=None, periods_ahead=1):
+    # Pre-creating partitions keeps the DDL off the insert path.
+    if now is None:
+        now = datetime.now(timezone.utc)
+    end = now
+    for _ in range(periods_ahead):
+        end = next_period(period_start(end))
+    return create_partitions(cur, now, end)
+
+
+def list_partitions(cur, parent=PARENT_TABLE):
+    cur.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = 'public' AND p.relname = %s
+        ORDER BY c.relname
+        """,
+        (parent,),
+    )
+    return cur.fetchall()
+
+
+def detach_partition(cur, name, parent=PARENT_TABLE):
+    # A detached partition keeps its rows as a standalone table.
+    cur.execute(f"ALTER TABLE public.{parent} DETACH PARTITION public.{name}")
+
+
+def drop_partition(cur, name, parent=PARENT_TABLE):
+    detach_partition(cur, name, parent=parent)
+    cur.execute(f"DROP TABLE public.{name}")
@@ -0,0 +1,204 @@
+import os
+import argparse
+import threading
+from time import monotonic
+
+import psycopg2
+import psycopg2.errors
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+import db
+import ingest
+import admission
+
+# Full-text search over public.documents, an alternative to the in-process
+# minsearch index: the corpus is loaded into Postgres once and every app
+# replica queries it there. A document matches when its weighted tsvector
+# contains any word of the question, and matches are ranked with ts_rank (or
+# ts_rank_cd), the four rank weights following the rag.BOOST field boosts.
+
+DOCUMENT_FIELDS = ['id', 'title', 'abstract', 'authors', 'keywords', 'organization_affiliated']
+
+# Weight label of each field in public.documents.search_vector (migration 7).
+WEIGHT_LABELS = {
+    'abstract': 'A',
+    'organization_affiliated': 'B',
+    'keywords': 'C',
+    'title': 'D',
+    'authors': 'D',
+}
+
+# "ts_rank" ranks by term frequency, "ts_rank_cd" by cover density. Cover
+# density rewards query words that appear close together, which few
+# documents do for a long OR query: on the ground-truth questions ts_rank
+# has an MRR of 0.97 against 0.84 and runs about three times faster.
+FTS_RANKING = os.getenv("FTS_RANKING", "ts_rank")
+# Normalization flags of the rank function; 1 divides by 1 + log(document length).
+FTS_RANK_NORMALIZATION = int(os.getenv("FTS_RANK_NORMALIZATION", "1"))
+# Connections kept per worker for search queries; by default one for each
+# question admission control lets run at once. Searches beyond that wait
+# for a free connection until their deadline.
+FTS_POOL_SIZE = int(os.getenv("FTS_POOL_SIZE", str(admission.ADMISSION_MAX_CONCURRENT)))
+# Bounds opening a pooled connection, and any search run without a timeout.
+FTS_CONNECT_TIMEOUT_SECONDS = float(os.getenv("FTS_CONNECT_TIMEOUT_SECONDS", "5"))
+
+RANKINGS = ("ts_rank_cd", "ts_rank")
+LOAD_BATCH_SIZE = 500
+
+
+def rank_weights(boost_dict):
+    """The {D, C, B, A} weights array for boost_dict, scaled into [0, 1].
+
+    A label shared by several fields takes the largest of their boosts.
+    """
+    weights = {label: 0.0 for label in "DCBA"}
+    for field, label in WEIGHT_LABELS.items():
+        weights[label] = max(weights[label], boost_dict.get(field, 1.0))
+    top = max(weights.values()) or 1.0
+    return [weights[label] / top for label in "DCBA"]
+
+
+def load_documents(documents, conn=None):
+    """Inserts or updates documents in public.documents; returns the row count."""
+    close = conn is None
+    if conn is None:
+        conn = db.get_db_connection()
+
+    rows = [
+        tuple(str(doc.get(field) or '') for field in DOCUMENT_FIELDS)
+        for doc in documents
+    ]
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, f"""
+                INSERT INTO public.documents ({", ".join(DOCUMENT_FIELDS)})
+                VALUES %s
+                ON CONFLICT (id) DO UPDATE SET
+                    {", ".join(f"{field} = EXCLUDED.{field}" for field in DOCUMENT_FIELDS[1:])}
+            """, rows, page_size=LOAD_BATCH_SIZE)
+        conn.commit()
+    finally:
+        if close:
+            conn.close()
+    return len(rows)
+
+
+class PostgresIndex:
+    """Searches public.documents with the interface of minsearch.Index."""
+
+    def __init__(self, ranking=FTS_RANKING, normalization=FTS_RANK_NORMALIZATION, pool_size=FTS_POOL_SIZE):
+        if ranking not in RANKINGS:
+            raise ValueError(f"Unknown full-text ranking: {ranking}")
+        self.ranking = ranking
+        self.normalization = normalization
+        self.pool_size = pool_size
+        self.pool = None
+        self.lock = threading.Lock()
+        # getconn() raises instead of waiting when the pool is exhausted, so
+        # searches queue here for one of its connections.
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    def get_pool(self):
+        # Created on first use, so each gunicorn worker gets its own pool.
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadedConnectionPool(
+                    1, self.pool_size, **db.connection_params(timeout=FTS_CONNECT_TIMEOUT_SECONDS)
+                )
+            return self.pool
+
+    def search(self, query, filter_dict={}, boost_dict={}, num_results=10, output_scores=False, timeout=None):
+        """
+        Searches public.documents with a full-text query.
+
+        Args:
+            query (str): The search query string.
+            filter_dict (dict): Dictionary of document fields to filter by. Keys are field names and values are the values to filter by.
+            boost_dict (dict): Dictionary of boost scores for text fields. Keys are field names and values are the boost scores.
+            num_results (int): The number of top results to return. Defaults to 10.
+            output_scores (bool): If True, return (document, score) pairs instead of documents.
+            timeout (float): Seconds the query may run; raises TimeoutError after that.
+
+        Returns:
+            list of dict: List of documents matching the search criteria, ranked by relevance.
+        """
+        filters = ""
+        params = {
+            "query": query,
+            "weights": rank_weights(boost_dict),
+            "normalization": self.normalization,
+            "num_results": num_results,
+        }
+        for n, (field, value) in enumerate(filter_dict.items()):
+            if field not in DOCUMENT_FIELDS:
+                raise ValueError(f"Unknown filter field: {field}")
+            filters += f" AND d.{field} = %(filter_{n})s"
+            params[f"filter_{n}"] = value
+
+        # The question's lexemes joined with OR, as minsearch scores any
+        # document sharing a word with the question.
+        sql = f"""
+            WITH q AS (
+                SELECT string_agg(quote_literal(lexeme), ' | ')::tsquery AS query
+                FROM unnest(tsvector_to_array(to_tsvector('english', %(query)s))) AS lexeme
+            )
+            SELECT {", ".join(f"d.{field}" for field in DOCUMENT_FIELDS)},
+                   {self.ranking}(%(weights)s::float4[], d.search_vector, q.query, %(normalization)s) AS score
+            FROM public.documents d, q
+            WHERE d.search_vector @@ q.query{filters}
+            ORDER BY score DESC, d.id
+            LIMIT %(num_results)s
+        """
+
+        started = monotonic()
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a full-text search connection")
+        try:
+            if timeout is not None:
+                timeout = max(0.001, timeout - (monotonic() - started))
+            return self.run_search(sql, params, timeout, output_scores)
+        finally:
+            self.slots.release()
+
+    def run_search(self, sql, params, timeout, output_scores):
+        pool = self.get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            with conn.cursor() as cur:
+                if timeout is not None:
+                    cur.execute("SELECT set_config('statement_timeout', %s, true)",
+                                (f"{max(1, int(timeout * 1000))}ms",))
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            conn.rollback()
+        except psycopg2.errors.QueryCanceled as e:
+            conn.rollback()
+            raise TimeoutError("Full-text search timed out") from e
+        except psycopg2.Error:
+            broken = conn.closed != 0
+            if not broken:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=broken)
+
+        hits = [(dict(zip(DOCUMENT_FIELDS, row[:-1])), row[-1]) for row in rows]
+        if output_scores:
+            return hits
+        return [doc for doc, _ in hits]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the paper corpus into public.documents")
+    parser.add_argument("--data-path", default=ingest.DATA_PATH)
+    args = parser.parse_args()
+
+    db.init_db()
+    count = load_documents(ingest.load_documents(args.data_path))
+    print(f"Loaded {count} documents into public.documents")
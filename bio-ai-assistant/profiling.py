@@ -0,0 +1,279 @@
+import io
+import os
+import sys
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from time import perf_counter
+
+from flask import g, request
+
+# Per-request profiling for the Flask app. A request is profiled when it
+# carries an X-Profile header ("stack" or "cprofile") with the configured
+# PROFILE_TOKEN, or when it falls in the PROFILE_SAMPLE_RATE share of
+# traffic. "stack" samples the request thread's Python stack every
+# PROFILE_INTERVAL seconds from a helper thread, together with the LLM call
+# threads working for the request (see attach), and writes collapsed stacks
+# (the input of flamegraph.pl and speedscope) plus a table of the functions
+# with the most samples. "cprofile" runs cProfile for the request and writes
+# the .prof file plus the top functions by cumulative time. Only the newest
+# PROFILE_MAX_PROFILES profiles are kept. When no request is profiled the
+# only cost is a header lookup and a random number per request.
+
+relative_path = "../data/profiles"
+container_path = "/app/data/profiles"
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", relative_path if os.path.isdir("../data") else container_path)
+# Share of requests profiled without a header, between 0 and 1.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Profiler used for sampled requests: "stack" or "cprofile".
+PROFILE_MODE = os.getenv("PROFILE_MODE", "stack")
+# Seconds between stack samples.
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# The X-Profile header is only honoured with a matching X-Profile-Token, and
+# ignored while no token is set.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Profiles kept in PROFILE_DIR; older ones are deleted as new ones are written.
+PROFILE_MAX_PROFILES = int(os.getenv("PROFILE_MAX_PROFILES", "100"))
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_MODES = ("stack", "cprofile")
+TOP_FUNCTIONS = 30
+
+# Root frame of the stacks sampled from a request's LLM call threads.
+LLM_THREAD_LABEL = "LLM call thread"
+
+# cProfile can only have one active profiler per process on Python 3.12 and
+# later, so concurrent cprofile requests are sampled instead.
+cprofile_lock = threading.Lock()
+
+# Profiles being taken, by the id of the request thread they belong to.
+active_profiles = {}
+active_lock = threading.Lock()
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples the Python stack of one thread, and of any threads added
+    while they work for it, until stopped."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        # Other sampled threads, with the root frame their stacks get.
+        self.helpers = {}
+        self.helpers_lock = threading.Lock()
+
+    def add_thread(self, thread_id, label):
+        with self.helpers_lock:
+            self.helpers[thread_id] = label
+
+    def remove_thread(self, thread_id):
+        with self.helpers_lock:
+            self.helpers.pop(thread_id, None)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self.helpers_lock:
+                threads = [(self.thread_id, None)] + list(self.helpers.items())
+            for thread_id, label in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                if label is not None:
+                    stack.append(label)
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def summarize_stacks(stacks, limit=TOP_FUNCTIONS):
+    total = sum(stacks.values())
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+
+    lines = [f"{total} samples"]
+    helper = sum(count for stack, count in stacks.items()
+                 if stack.startswith(LLM_THREAD_LABEL + ";"))
+    if helper:
+        lines[0] += (f", {helper} from LLM call threads (the request thread waits in"
+                     f" resilience.attempt meanwhile)")
+    lines.append(f"{'self':>7} {'self%':>6} {'total':>7} {'total%':>6}  function")
+    for function, count in inclusive.most_common(limit):
+        lines.append(
+            f"{own[function]:>7} {100 * own[function] / total:>5.1f}% "
+            f"{count:>7} {100 * count / total:>5.1f}%  {function}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+class RequestProfile:
+    def __init__(self, mode, name):
+        self.mode = mode
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.started = perf_counter()
+        if mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(threading.get_ident())
+            self.profiler.start()
+
+    def finish(self, directory=PROFILE_DIR):
+        """Stops profiling and writes the files; returns their common path prefix."""
+        elapsed = perf_counter() - self.started
+        with active_lock:
+            active_profiles.pop(self.thread_id, None)
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, self.name)
+        header = f"{self.name}: {elapsed * 1000:.1f} ms, {self.mode}\n"
+
+        if self.mode == "cprofile":
+            try:
+                self.profiler.disable()
+            finally:
+                cprofile_lock.release()
+            self.profiler.dump_stats(prefix + ".prof")
+            summary = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=summary)
+            # cProfile only sees this thread: the LLM requests run on
+            # admission.llm_executor threads and show up as this wait.
+            summary.write("LLM calls run on other threads; their time is the wait() "
+                          "under resilience.attempt below.\n")
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            text = summary.getvalue()
+        else:
+            self.profiler.stop()
+            stacks = self.profiler.stacks
+            with open(prefix + ".folded", "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            text = summarize_stacks(stacks) if stacks else "no samples\n"
+
+        with open(prefix + ".txt", "w") as f:
+            f.write(header + text)
+        prune_profiles(directory)
+        return prefix
+
+
+def prune_profiles(directory, keep=PROFILE_MAX_PROFILES):
+    """Deletes all but the newest `keep` profiles in directory."""
+    # Profile names start with their UTC timestamp, so they sort by age.
+    profiles = {}
+    for filename in os.listdir(directory):
+        name, extension = os.path.splitext(filename)
+        if extension in (".txt", ".folded", ".prof"):
+            profiles.setdefault(name, []).append(filename)
+    for name in sorted(profiles)[:max(0, len(profiles) - keep)]:
+        for filename in profiles[name]:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                # Pruned by a concurrent request.
+                pass
+
+
+def attach(function):
+    """Wraps function, about to be handed to another thread by the current
+    request, so that thread is sampled into the request's stack profile
+    while it runs it. Returns function itself when nothing is profiled."""
+    with active_lock:
+        profile = active_profiles.get(threading.get_ident())
+    if profile is None or profile.mode != "stack":
+        return function
+
+    sampler = profile.profiler
+
+    def run(*args, **kwargs):
+        thread_id = threading.get_ident()
+        sampler.add_thread(thread_id, LLM_THREAD_LABEL)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            sampler.remove_thread(thread_id)
+
+    return run
+
+
+def requested_mode(headers):
+    """The profiler asked for by the request, if any."""
+    mode = headers.get(PROFILE_HEADER)
+    if mode is not None and PROFILE_TOKEN and headers.get(PROFILE_TOKEN_HEADER) == PROFILE_TOKEN:
+        return mode if mode in PROFILE_MODES else PROFILE_MODE
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_MODE
+    return None
+
+
+def start(headers, endpoint):
+    mode = requested_mode(headers)
+    if mode is None:
+        return None
+    if mode == "cprofile" and not cprofile_lock.acquire(blocking=False):
+        mode = "stack"
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    name = f"{timestamp}-{endpoint}-{uuid.uuid4().hex[:8]}"
+    try:
+        profile = RequestProfile(mode, name)
+    except ValueError:
+        # Another profiling tool is already active in this process.
+        if mode == "cprofile":
+            cprofile_lock.release()
+        profile = RequestProfile("stack", name)
+    with active_lock:
+        active_profiles[profile.thread_id] = profile
+    return profile
+
+
+def init_app(app):
+    """Registers the profiling hooks on a Flask app."""
+
+    @app.before_request
+    def start_profile():
+        g.profile = start(request.headers, request.endpoint or "unknown")
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            try:
+                prefix = profile.finish()
+                response.headers["X-Profile-Id"] = os.path.basename(prefix)
+            except Exception as e:
+                print(f"Error writing profile: {e}")
+        return response
+
+    @app.teardown_request
+    def finish_failed_profile(error):
+        # after_request is skipped when the view raises; still stop the
+        # profiler and keep what it captured.
+        profile = g.pop("profile", None)
+        if profile is not None:
+            try:
+                profile.finish()
+            except Exception as e:
+                print(f"Error writing profile: {e}")
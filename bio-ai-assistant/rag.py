@@ -1,7 +1,11 @@
 import json
 import os
+import re
 from time import time
 import ingest
+import admission
+import resilience
+import gemini_stub
 import google.auth
 from google.oauth2 import service_account
 import vertexai
@@ -12,36 +16,165 @@ _ = load_dotenv(find_dotenv())
 # Global Model Name 
 MODEL_NAME = "gemini-1.5-flash-001" 
 
-# Set up the API key and project ID for Gemini 
-PROJECT_ID = os.environ['GCP_PROJECT_ID']
+# "vertex" calls Gemini on Vertex AI; "stub" uses the local stand-in in
+# gemini_stub.py, for offline benchmarks and tests without network access.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "vertex")
 
-relative_path = "../pacific-ethos-428312-n5-eb4864ff3add.json"
-container_path = "/app/pacific-ethos-428312-n5-eb4864ff3add.json"
+def init_vertex():
+    # Set up the API key and project ID for Gemini
+    project_id = os.environ['GCP_PROJECT_ID']
 
-if os.path.exists(relative_path):
-    credentials_path = relative_path
-else:
-    credentials_path = container_path
+    relative_path = "../pacific-ethos-428312-n5-eb4864ff3add.json"
+    container_path = "/app/pacific-ethos-428312-n5-eb4864ff3add.json"
 
-credentials = service_account.Credentials.from_service_account_file(credentials_path)
-vertexai.init(project=PROJECT_ID, credentials=credentials, location="us-central1")
+    if os.path.exists(relative_path):
+        credentials_path = relative_path
+    else:
+        credentials_path = container_path
+
+    credentials = service_account.Credentials.from_service_account_file(credentials_path)
+    vertexai.init(project=project_id, credentials=credentials, location="us-central1")
+
+if LLM_BACKEND == "vertex":
+    init_vertex()
+
+def get_model(model_name):
+    if LLM_BACKEND == "stub":
+        return gemini_stub.GenerativeModel(model_name)
+    return GenerativeModel(model_name)
+
+# "document" indexes whole papers; "passage" indexes overlapping sentence
+# windows of each abstract and only sends the best passages to the LLM.
+INDEX_MODE = os.getenv("INDEX_MODE", "document")
+# How passage scores are combined into a paper score: "max" or "sum".
+PASSAGE_AGGREGATION = os.getenv("PASSAGE_AGGREGATION", "max")
+# Passages fetched per requested paper, and passages kept per paper.
+PASSAGE_CANDIDATES = 5
+PASSAGES_PER_DOCUMENT = 2
+
+# Adaptive retrieval depth. "none" always sends RETRIEVAL_MAX_RESULTS papers;
+# "threshold" keeps papers scoring at least RETRIEVAL_THRESHOLD times the best
+# score; "gap" keeps the papers before the largest drop in score. Either way
+# at least RETRIEVAL_MIN_RESULTS papers are kept when there are that many.
+RETRIEVAL_CUTOFF = os.getenv("RETRIEVAL_CUTOFF", "none")
+RETRIEVAL_THRESHOLD = float(os.getenv("RETRIEVAL_THRESHOLD", "0.5"))
+RETRIEVAL_MIN_RESULTS = int(os.getenv("RETRIEVAL_MIN_RESULTS", "2"))
+RETRIEVAL_MAX_RESULTS = int(os.getenv("RETRIEVAL_MAX_RESULTS", "10"))
+
+# Number of shard processes the index is spread over; 0 keeps it in-process.
+SEARCH_SHARDS = int(os.getenv("SEARCH_SHARDS", "0"))
+
+# "on" collapses near-duplicate papers into one canonical document before
+# indexing; see dedup.py.
+DEDUPLICATE = os.getenv("DEDUPLICATE", "off")
+
+# "minsearch" searches an in-process index of the JSONL; "postgres" runs
+# full-text queries against public.documents, loaded by pg_search.py.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "minsearch")
+
+BOOST = {
+      'abstract': 2.38,
+      'authors': 0.03,
+      'keywords': 0.52,
+      'organization_affiliated': 1.33,
+      'title': 0.20
+}
 
 #Load the indexed data
-index = ingest.load_index()
-
-def search(query):
-    boost = {
-          'abstract': 2.38,
-          'authors': 0.03,
-          'keywords': 0.52,
-          'organization_affiliated': 1.33,
-          'title': 0.20
-    }
+if SEARCH_BACKEND == "postgres":
+    if INDEX_MODE == "passage":
+        raise ValueError("The postgres search backend only indexes whole documents")
+    # Imported here because db connects to Postgres on import, which the
+    # offline evaluation scripts importing rag must not need.
+    import pg_search
+    index = pg_search.PostgresIndex()
+elif INDEX_MODE == "passage":
+    index = ingest.load_passage_index(num_shards=SEARCH_SHARDS, deduplicate=DEDUPLICATE == "on")
+else:
+    index = ingest.load_index(num_shards=SEARCH_SHARDS, deduplicate=DEDUPLICATE == "on")
 
-    results = index.search(
-        query=query, filter_dict={}, boost_dict=boost, num_results=10
+def search_with_scores(query, num_results=RETRIEVAL_MAX_RESULTS, cutoff=RETRIEVAL_CUTOFF, deadline=None):
+    # In-process search is not interruptible; sharded and Postgres search
+    # stop at the deadline.
+    options = {}
+    if deadline is not None:
+        deadline.check("search")
+        if SEARCH_SHARDS > 0 or SEARCH_BACKEND == "postgres":
+            options["timeout"] = deadline.remaining()
+
+    try:
+        if INDEX_MODE == "passage":
+            papers = search_passages(index, query, num_results=num_results, **options)
+            hits = [(paper, paper['score']) for paper in papers]
+        else:
+            hits = index.search(
+                query=query, filter_dict={}, boost_dict=BOOST, num_results=num_results,
+                output_scores=True, **options
+            )
+    except TimeoutError:
+        admission.count("deadline_exceeded", "search")
+        raise admission.DeadlineExceeded("Deadline exceeded during search")
+
+    depth = cutoff_depth([score for _, score in hits], cutoff)
+    return hits[:depth]
+
+def search(query, num_results=RETRIEVAL_MAX_RESULTS, cutoff=RETRIEVAL_CUTOFF):
+    return [doc for doc, _ in search_with_scores(query, num_results=num_results, cutoff=cutoff)]
+
+def cutoff_depth(scores, cutoff=RETRIEVAL_CUTOFF, threshold=RETRIEVAL_THRESHOLD,
+                 min_results=RETRIEVAL_MIN_RESULTS, max_results=RETRIEVAL_MAX_RESULTS):
+    """Number of hits to keep out of scores, which are sorted best first."""
+    n = min(len(scores), max_results)
+    if cutoff == "none" or n <= min_results:
+        return n
+
+    if cutoff == "threshold":
+        keep = sum(1 for score in scores[:n] if score >= threshold * scores[0])
+        return max(min_results, keep)
+
+    if cutoff == "gap":
+        # Keep the hits before the largest drop between neighbouring scores,
+        # looking only at cuts that leave at least min_results hits.
+        gaps = [scores[i - 1] - scores[i] for i in range(max(min_results, 1), n)]
+        if not gaps or max(gaps) <= 0:
+            return n
+        return max(min_results, 1) + gaps.index(max(gaps))
+
+    raise ValueError(f"Unknown retrieval cutoff: {cutoff}")
+
+def search_passages(passage_index, query, num_results=10, aggregation=PASSAGE_AGGREGATION, **options):
+    hits = passage_index.search(
+        query=query,
+        filter_dict={},
+        boost_dict=BOOST,
+        num_results=num_results * PASSAGE_CANDIDATES,
+        output_scores=True,
+        **options,
     )
 
+    papers = {}
+    for passage, score in hits:
+        paper = papers.get(passage['parent_id'])
+        if paper is None:
+            paper = {
+                field: value for field, value in passage.items()
+                if field not in ('abstract', 'id', 'parent_id')
+            }
+            paper['id'] = passage['parent_id']
+            paper['passages'] = []
+            paper['score'] = 0.0
+            papers[passage['parent_id']] = paper
+
+        # Hits arrive best first, so each paper's passages stay in score order.
+        paper['passages'].append(passage['abstract'])
+        if aggregation == "sum":
+            paper['score'] += score
+        else:
+            paper['score'] = max(paper['score'], score)
+
+    results = sorted(papers.values(), key=lambda paper: paper['score'], reverse=True)[:num_results]
+    for paper in results:
+        paper['passages'] = paper['passages'][:PASSAGES_PER_DOCUMENT]
     return results
 
 prompt_template = """
@@ -66,27 +199,56 @@ organization_affiliated: {organization_affiliated}
 title: {title}
 """.strip()
 
+# Passage mode keeps the exact title, authors and keywords but leaves out the
+# long organization_affiliated lists, which rarely answer a question and
+# would otherwise make up most of the prompt.
+passage_entry_template = """
+passages: {passages}
+authors: {authors} 
+keywords: {keywords} 
+title: {title}
+""".strip()
+
 def build_prompt(query, search_results):
     context = ""
     
     for doc in search_results:
-        context = context + entry_template.format(**doc) + "\n\n"
+        if 'passages' in doc:
+            entry = passage_entry_template.format(**{**doc, 'passages': " [...] ".join(doc['passages'])})
+        else:
+            entry = entry_template.format(**doc)
+        context = context + entry + "\n\n"
 
     prompt = prompt_template.format(question=query, context=context).strip()
     return prompt
 
-def llm(prompt, model=MODEL_NAME):
-    model = GenerativeModel(model)
-    prompt_tokens = model.count_tokens(prompt)
-    response = model.generate_content(prompt)
-    response_tokens = model.count_tokens(response.text)
+def billable_characters(text):
+    # Vertex AI bills every character except whitespace.
+    return len(re.sub(r"\s", "", text))
+
+
+def llm(prompt, model=MODEL_NAME, generation_config=None, deadline=None, stage="answer"):
+    model_name = model
+    model = get_model(model)
+    if deadline is not None:
+        deadline.check(stage)
+
+    # Bounded by the deadline, retried and optionally hedged; every attempt
+    # feeds the live latency and error rate the router uses.
+    response = resilience.caller.call(
+        model.generate_content, model_name, prompt,
+        generation_config=generation_config, deadline=deadline, stage=stage,
+    )
+
+    # Token counts come with the response, so no count_tokens requests are
+    # made outside the deadline.
     usage_metadata = response.usage_metadata
 
     token_stats = {
-            "prompt_tokens": prompt_tokens.total_tokens,
-            "prompt_characters": prompt_tokens.total_billable_characters,
+            "prompt_tokens": usage_metadata.prompt_token_count,
+            "prompt_characters": billable_characters(prompt),
             "candidates_tokens": usage_metadata.candidates_token_count,
-            "candidates_characters": response_tokens.total_billable_characters,
+            "candidates_characters": billable_characters(response.text),
             "total_tokens": usage_metadata.total_token_count,
 
         }
@@ -115,9 +277,9 @@ and provide your evaluation in parsable JSON without using code blocks:
 """.strip()
 
 
-def evaluate_relevance(question, answer):
+def evaluate_relevance(question, answer, deadline=None):
     prompt = evaluation_prompt_template.format(question=question, answer_llm=answer)
-    evaluation_llm, tokens = llm(prompt, model=MODEL_NAME)
+    evaluation_llm, tokens = llm(prompt, model=MODEL_NAME, deadline=deadline, stage="judge")
 
     try:
         evaluation = evaluation_llm.strip().replace('json', '').replace('`', '')
@@ -128,12 +290,79 @@ def evaluate_relevance(question, answer):
         return result, tokens
 
 
+# Vertex AI prices in USD per 1,000 billable characters of (prompt, response).
+MODEL_PRICES = {
+    "gemini-1.5-flash-001": (0.00001875, 0.0000375),
+    "gemini-1.5-pro-001": (0.0003125, 0.00125),
+    "gemini-1.0-pro": (0.000125, 0.000375),
+}
+
+
+# "separate" answers with one request and judges the answer with a second;
+# "structured" asks for the answer and a self-assessed relevance label in one
+# request with a JSON response schema.
+RAG_MODE = os.getenv("RAG_MODE", "separate")
+
+structured_instructions = """
+Then assess how relevant your answer is to the QUESTION and classify it
+as "NON_RELEVANT", "PARTLY_RELEVANT", or "RELEVANT", with a brief explanation.
+Return the answer, the relevance label and the explanation as JSON.
+""".strip()
+
+# Schema types are the names of Vertex AI's Schema.Type enum; the SDK turns
+# this dict into its GenerationConfig and rejects JSON-schema spellings.
+STRUCTURED_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "OBJECT",
+        "properties": {
+            "answer": {"type": "STRING"},
+            "relevance": {
+                "type": "STRING",
+                "enum": ["NON_RELEVANT", "PARTLY_RELEVANT", "RELEVANT"],
+            },
+            "explanation": {"type": "STRING"},
+        },
+        "required": ["answer", "relevance", "explanation"],
+    },
+}
+
+NO_TOKENS = {
+    "prompt_tokens": 0,
+    "prompt_characters": 0,
+    "candidates_tokens": 0,
+    "candidates_characters": 0,
+    "total_tokens": 0,
+}
+
+
+def answer_with_relevance(prompt, model=MODEL_NAME, deadline=None):
+    response, tokens = llm(
+        prompt + "\n\n" + structured_instructions,
+        model=model,
+        generation_config=STRUCTURED_GENERATION_CONFIG,
+        deadline=deadline,
+    )
+
+    try:
+        result = json.loads(response)
+        relevance = {
+            "Relevance": result.get("relevance", "UNKNOWN"),
+            "Explanation": result.get("explanation", "Failed to parse evaluation"),
+        }
+        return result.get("answer", ""), relevance, tokens
+    except json.JSONDecodeError:
+        relevance = {"Relevance": "UNKNOWN", "Explanation": "Failed to parse evaluation"}
+        return response, relevance, tokens
+
+
 def calculate_gemini_cost(model, tokens):
     gemini_cost = 0
 
-    if model == MODEL_NAME:
+    if model in MODEL_PRICES:
+        prompt_price, candidates_price = MODEL_PRICES[model]
         gemini_cost = (
-            tokens["prompt_characters"] * 0.00001875 + tokens["candidates_characters"] * 0.0000375
+            tokens["prompt_characters"] * prompt_price + tokens["candidates_characters"] * candidates_price
         ) / 1000
     else:
         print("Model not recognized. Gemini cost calculation failed.")
@@ -141,20 +370,42 @@ def calculate_gemini_cost(model, tokens):
     return gemini_cost
 
 
-def rag(query, model=MODEL_NAME):
+def skipped_relevance(reason):
+    admission.record_shed("judge", reason)
+    relevance = {"Relevance": "SKIPPED", "Explanation": f"Relevance evaluation skipped ({reason})"}
+    return relevance, NO_TOKENS
+
+
+def rag(query, model=MODEL_NAME, search_results=None, mode=RAG_MODE, deadline=None, judge=True):
+    """Answers query; with judge=False the separate relevance judge is skipped.
+
+    With a deadline every stage gives up with admission.DeadlineExceeded once
+    it passes, and the judge is skipped when too little time is left for it.
+    """
     t0 = time()
 
-    search_results = search(query)
+    if search_results is None:
+        search_results = [doc for doc, _ in search_with_scores(query, deadline=deadline)]
     prompt = build_prompt(query, search_results)
-    answer, token_stats = llm(prompt, model=model)
 
-    relevance, rel_token_stats = evaluate_relevance(query, answer)
+    if mode == "structured":
+        answer, relevance, token_stats = answer_with_relevance(prompt, model=model, deadline=deadline)
+        rel_token_stats = NO_TOKENS
+    else:
+        answer, token_stats = llm(prompt, model=model, deadline=deadline)
+        if not judge:
+            relevance, rel_token_stats = skipped_relevance("load")
+        elif deadline is not None and deadline.remaining() < admission.ADMISSION_JUDGE_MIN_SECONDS:
+            relevance, rel_token_stats = skipped_relevance("deadline")
+        else:
+            relevance, rel_token_stats = evaluate_relevance(query, answer, deadline=deadline)
 
     t1 = time()
     took = t1 - t0
 
     gemini_cost_rag = calculate_gemini_cost(model, token_stats)
-    gemini_cost_eval = calculate_gemini_cost(model, rel_token_stats)
+    # The judge always runs on MODEL_NAME, whichever model answered.
+    gemini_cost_eval = calculate_gemini_cost(MODEL_NAME, rel_token_stats)
 
     gemini_cost = gemini_cost_rag + gemini_cost_eval
 
@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from time import monotonic, sleep
+
+import admission
+import profiling
+import routing
+
+# Bounds the time of every generate_content call. A call has a deadline,
+# the request's when there is one and at most LLM_CALL_TIMEOUT_SECONDS.
+# Retryable errors (quota, unavailable) are retried with exponential backoff
+# and full jitter while the deadline allows. With LLM_HEDGING=on a second,
+# identical request is sent when the first has not answered within the
+# model's recent p95 latency, and whichever succeeds first is used; the
+# extra requests are capped at LLM_HEDGE_BUDGET of all calls.
+
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_CAP_SECONDS = float(os.getenv("LLM_RETRY_CAP_SECONDS", "4"))
+
+# "on" hedges slow calls; "off" sends one request at a time.
+LLM_HEDGING = os.getenv("LLM_HEDGING", "off")
+# Hedged requests allowed per call, and how many may be spent in a burst.
+# A hedge fires for calls slower than the p95, so about 5% of calls qualify
+# even when nothing is wrong; a budget of 5% would run dry in normal
+# operation and leave the slowest calls unhedged, hence twice that.
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_HEDGE_BURST = float(os.getenv("LLM_HEDGE_BURST", "10"))
+# Successful calls needed in routing's window before the p95 is trusted.
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+RETRYABLE_ERRORS = ("Quota exceeded", "429", "503", "Resource exhausted", "Service Unavailable")
+
+
+def is_retryable(error):
+    message = str(error)
+    return any(marker in message for marker in RETRYABLE_ERRORS)
+
+
+def backoff_delay(attempt, base=2.0, cap=60.0):
+    # Exponential backoff with full jitter.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class HedgeBudget:
+    """Token bucket: every call earns `ratio` of a hedge, up to `burst`."""
+
+    def __init__(self, ratio=LLM_HEDGE_BUDGET, burst=LLM_HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class ResilientCaller:
+    def __init__(self, timeout=LLM_CALL_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES,
+                 hedging=LLM_HEDGING == "on", hedge_budget=LLM_HEDGE_BUDGET,
+                 hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+                 retry_base=LLM_RETRY_BASE_SECONDS, retry_cap=LLM_RETRY_CAP_SECONDS):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self.budget = HedgeBudget(hedge_budget)
+        self.hedge_min_samples = hedge_min_samples
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+
+    def hedge_delay(self, model_name):
+        if not self.hedging:
+            return None
+        calls, p95, _ = routing.get_stats(model_name).snapshot()
+        if calls < self.hedge_min_samples or p95 == float("inf"):
+            return None
+        return p95
+
+    def submit(self, function, model_name, *args, **kwargs):
+        # Every attempt's latency and outcome feed routing's model health and
+        # the hedge delay, including attempts whose result is not used.
+        started = monotonic()
+
+        def record(future):
+            # A request cancelled before it ran never got an answer either,
+            # and future.exception() would raise CancelledError for it.
+            ok = not future.cancelled() and future.exception() is None
+            routing.record_call(model_name, monotonic() - started, ok=ok)
+
+        # A profiled request's samples include the thread running its request.
+        future = admission.llm_executor.submit(profiling.attach(function), *args, **kwargs)
+        future.add_done_callback(record)
+        return future
+
+    def attempt(self, function, model_name, expires, stage, args, kwargs):
+        """One request, plus a hedge if it is slow; returns the first success."""
+        primary = self.submit(function, model_name, *args, **kwargs)
+        pending = {primary}
+        delay = self.hedge_delay(model_name)
+        hedged = False
+        error = None
+
+        while pending:
+            remaining = expires - monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining
+            if delay is not None and not hedged:
+                timeout = min(remaining, delay)
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        admission.count("hedge_won", stage)
+                    return future.result()
+                error = error or future.exception()
+
+            if not done and delay is not None and not hedged:
+                hedged = True
+                if self.budget.spend():
+                    admission.count("hedged", stage)
+                    pending.add(self.submit(function, model_name, *args, **kwargs))
+                else:
+                    admission.count("hedge_denied", stage)
+
+        if pending:
+            # Out of time: the requests still running are left to finish in
+            # the background and their results are dropped.
+            for future in pending:
+                if not future.cancel():
+                    admission.count("abandoned", stage)
+            admission.count("deadline_exceeded", stage)
+            raise admission.DeadlineExceeded(f"Deadline exceeded during {stage}")
+        raise error
+
+    def call(self, function, model_name, *args, deadline=None, stage="answer", **kwargs):
+        """Calls function(*args, **kwargs) for model_name within the deadline,
+        retrying retryable errors and hedging slow attempts."""
+        expires = monotonic() + self.timeout
+        if deadline is not None:
+            expires = min(expires, deadline.expires)
+        self.budget.earn()
+
+        retries = 0
+        while True:
+            if monotonic() >= expires:
+                admission.count("deadline_exceeded", stage)
+                raise admission.DeadlineExceeded(f"Deadline exceeded before {stage}")
+            try:
+                return self.attempt(function, model_name, expires, stage, args, kwargs)
+            except admission.DeadlineExceeded:
+                raise
+            except Exception as e:
+                delay = backoff_delay(retries, self.retry_base, self.retry_cap)
+                if not is_retryable(e) or retries >= self.max_retries or monotonic() + delay >= expires:
+                    raise
+                print(f"Retryable error from {model_name} ({e}); retrying in {delay:.2f}s")
+                admission.count("retried", stage)
+                sleep(delay)
+                retries += 1
+
+
+caller = ResilientCaller()
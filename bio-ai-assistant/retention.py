@@ -0,0 +1,165 @@
+import os
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dotenv import load_dotenv
+
+os.environ['RUN_TIMEZONE_CHECK'] = '0'
+
+import db
+import partitions
+from archive import ARCHIVE_PATH, archive_dir
+
+load_dotenv()
+
+# Partitions whose whole period ended more than this many days ago are cold:
+# they are exported to Parquet and removed from the hot table. The dashboard
+# rollups are kept, so its history is unaffected.
+RETENTION_DAYS = int(os.getenv("CONVERSATIONS_RETENTION_DAYS", "90"))
+
+EXPORT_BATCH_SIZE = 10000
+PARQUET_COMPRESSION = "zstd"
+
+ARROW_TYPES = {
+    "text": pa.string(),
+    "integer": pa.int32(),
+    "bigint": pa.int64(),
+    "double precision": pa.float64(),
+    "boolean": pa.bool_(),
+    "timestamp with time zone": pa.timestamp("us", tz="UTC"),
+}
+
+
+def table_schema(cur, table=partitions.PARENT_TABLE):
+    cur.execute(
+        """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+        ORDER BY ordinal_position
+        """,
+        (table,),
+    )
+    return pa.schema([
+        (name, ARROW_TYPES.get(data_type, pa.string()))
+        for name, data_type in cur.fetchall()
+    ])
+
+
+def cold_partitions(cur, cutoff):
+    cold = []
+    for name, _ in partitions.list_partitions(cur):
+        # A DEFAULT or hand-attached partition has no period in its name and
+        # may hold recent rows, so it is never archived.
+        try:
+            start, end = partitions.parse_partition_name(name)
+        except ValueError:
+            print(f"Skipping {name}: not a dated partition")
+            continue
+        if end <= cutoff:
+            cold.append(name)
+    return cold
+
+
+def export_partition(conn, name, path=ARCHIVE_PATH):
+    """Stream one partition into a zstd-compressed Parquet file.
+
+    Rows are written in timestamp order so readers can skip row groups by
+    their min/max statistics. The file is written under a temporary name and
+    renamed once complete, so a crash never leaves a partial archive behind.
+    """
+    os.makedirs(archive_dir(path), exist_ok=True)
+    target = os.path.join(archive_dir(path), f"{name}.parquet")
+    partial = target + ".partial"
+
+    with conn.cursor() as cur:
+        schema = table_schema(cur)
+
+    rows_written = 0
+    with pq.ParquetWriter(partial, schema, compression=PARQUET_COMPRESSION) as writer:
+        # A named cursor streams from the server instead of loading the
+        # whole partition into memory.
+        with conn.cursor(name=f"export_{name}") as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            cur.execute(f"SELECT * FROM public.{name} ORDER BY timestamp")
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                batch = pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema,
+                )
+                writer.write_table(batch)
+                rows_written += len(rows)
+
+    os.replace(partial, target)
+    return target, rows_written
+
+
+def archive_partition(conn, name, drop=True, path=ARCHIVE_PATH):
+    with conn.cursor() as cur:
+        # Timestamps are exported in UTC whatever the server time zone is.
+        cur.execute("SET LOCAL TIME ZONE 'UTC'")
+        # Block late writes to this partition until it is detached.
+        cur.execute(f"LOCK TABLE public.{name} IN SHARE MODE")
+        cur.execute(f"SELECT COUNT(*) FROM public.{name}")
+        expected = cur.fetchone()[0]
+
+    target, rows_written = export_partition(conn, name, path=path)
+    if rows_written != expected:
+        raise RuntimeError(f"Exported {rows_written} rows from {name}, expected {expected}")
+
+    with conn.cursor() as cur:
+        if drop:
+            partitions.drop_partition(cur, name)
+        else:
+            partitions.detach_partition(cur, name)
+    conn.commit()
+    return target, rows_written
+
+
+def run_retention(retention_days=RETENTION_DAYS, drop=True, dry_run=False, path=ARCHIVE_PATH):
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    conn = db.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            names = cold_partitions(cur, cutoff)
+        conn.commit()
+
+        if not names:
+            print(f"No partitions older than {cutoff:%Y-%m-%d}.")
+        for name in names:
+            if dry_run:
+                print(f"Would archive {name}")
+                continue
+            try:
+                target, rows = archive_partition(conn, name, drop=drop, path=path)
+                action = "dropped" if drop else "detached"
+                print(f"Archived {rows} rows from {name} to {target} and {action} it.")
+            except Exception as e:
+                print(f"Error archiving {name}: {e}")
+                conn.rollback()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive cold conversation partitions to Parquet")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--keep-detached", action="store_true",
+                        help="Detach archived partitions instead of dropping them")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--path", default=ARCHIVE_PATH)
+    args = parser.parse_args()
+
+    run_retention(
+        retention_days=args.retention_days,
+        drop=not args.keep_detached,
+        dry_run=args.dry_run,
+        path=args.path,
+    )
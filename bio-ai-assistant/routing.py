@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import deque
+from time import monotonic, perf_counter
+
+import numpy as np
+
+# Chooses the Gemini model for each question from cheap local signals. A
+# short question whose top search hit clearly beats the runner-up goes to
+# the fast model. A long question, or one where retrieval is unsure, goes to
+# the quality model, unless that model's recent p95 latency or error rate in
+# this worker is over budget, in which case the fast model answers instead.
+
+# "on" routes every question; "off" always uses ROUTING_DEFAULT_MODEL.
+ROUTING = os.getenv("ROUTING", "off")
+ROUTING_DEFAULT_MODEL = os.getenv("ROUTING_DEFAULT_MODEL", "gemini-1.5-flash-001")
+ROUTING_FAST_MODEL = os.getenv("ROUTING_FAST_MODEL", "gemini-1.5-flash-001")
+ROUTING_QUALITY_MODEL = os.getenv("ROUTING_QUALITY_MODEL", "gemini-1.5-pro-001")
+
+# Questions with more words than this are treated as hard.
+ROUTING_LONG_QUERY_WORDS = int(os.getenv("ROUTING_LONG_QUERY_WORDS", "30"))
+# Retrieval is confident when (best - second best) / best is at least this.
+# On the ground-truth questions the top hit is right 99% of the time above
+# 0.2 and 57% of the time below it.
+ROUTING_MIN_MARGIN = float(os.getenv("ROUTING_MIN_MARGIN", "0.2"))
+
+# Health budget of a model over the last ROUTING_WINDOW_SECONDS.
+ROUTING_MAX_P95_SECONDS = float(os.getenv("ROUTING_MAX_P95_SECONDS", "8"))
+ROUTING_MAX_ERROR_RATE = float(os.getenv("ROUTING_MAX_ERROR_RATE", "0.1"))
+ROUTING_WINDOW_SECONDS = float(os.getenv("ROUTING_WINDOW_SECONDS", "300"))
+# Fewer calls than this in the window say nothing about a model's health.
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "20"))
+
+MAX_SAMPLES = 1000
+
+
+class ModelStats:
+    """Latency and outcome of a model's recent generate_content calls in this process."""
+
+    def __init__(self, window=ROUTING_WINDOW_SECONDS):
+        self.window = window
+        self.calls = deque(maxlen=MAX_SAMPLES)
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self.lock:
+            self.calls.append((monotonic(), latency, ok))
+
+    def snapshot(self):
+        """Returns (calls, p95 latency, error rate) over the window."""
+        cutoff = monotonic() - self.window
+        with self.lock:
+            while self.calls and self.calls[0][0] < cutoff:
+                self.calls.popleft()
+            calls = list(self.calls)
+
+        if not calls:
+            return 0, 0.0, 0.0
+        latencies = [latency for _, latency, ok in calls if ok]
+        p95 = float(np.percentile(latencies, 95)) if latencies else float("inf")
+        errors = sum(1 for _, _, ok in calls if not ok)
+        return len(calls), p95, errors / len(calls)
+
+
+model_stats = {}
+model_stats_lock = threading.Lock()
+
+
+def get_stats(model):
+    with model_stats_lock:
+        if model not in model_stats:
+            model_stats[model] = ModelStats()
+        return model_stats[model]
+
+
+def record_call(model, latency, ok):
+    get_stats(model).record(latency, ok)
+
+
+def health(model):
+    """Returns None if the model is within budget, else the reason it is not."""
+    calls, p95, error_rate = get_stats(model).snapshot()
+    if calls < ROUTING_MIN_SAMPLES:
+        return None
+    if error_rate > ROUTING_MAX_ERROR_RATE:
+        return "errors"
+    if p95 > ROUTING_MAX_P95_SECONDS:
+        return "latency"
+    return None
+
+
+def retrieval_margin(scores):
+    if not scores or scores[0] <= 0:
+        return 0.0
+    if len(scores) == 1:
+        return 1.0
+    return (scores[0] - scores[1]) / scores[0]
+
+
+def route(question, scores, mode=ROUTING):
+    """Picks the model for a question given its search scores, best first.
+
+    Returns (model, reason, seconds spent deciding).
+    """
+    t0 = perf_counter()
+
+    if mode == "off":
+        return ROUTING_DEFAULT_MODEL, "fixed", perf_counter() - t0
+
+    if len(question.split()) > ROUTING_LONG_QUERY_WORDS:
+        model, reason = ROUTING_QUALITY_MODEL, "long-query"
+    elif retrieval_margin(scores) < ROUTING_MIN_MARGIN:
+        model, reason = ROUTING_QUALITY_MODEL, "low-confidence"
+    else:
+        model, reason = ROUTING_FAST_MODEL, "confident"
+
+    if model != ROUTING_FAST_MODEL:
+        problem = health(model)
+        if problem is not None:
+            model, reason = ROUTING_FAST_MODEL, f"fallback-{problem}"
+
+    return model, reason, perf_counter() - t0
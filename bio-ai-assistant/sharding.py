@@ -0,0 +1,271 @@
+import heapq
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+import minsearch
+
+# A search index split across shard processes. Documents are dealt
+# round-robin to N shards, each holding a minsearch.Index over its slice, so a
+# query is scored on N cores at once. Vocabulary and IDF weights are computed
+# over the whole corpus and handed to every shard, which makes every score
+# identical to that of a single unsharded index. The per-shard top-k lists
+# are then merged with a heap.
+
+# Vectorizer parameters that prune or fix the vocabulary using corpus-wide
+# counts, which the shards cannot apply on their own.
+UNSUPPORTED_PARAMS = ("min_df", "max_df", "max_features", "vocabulary")
+
+
+def document_frequencies(texts, vectorizer_params):
+    """Returns the terms found in texts, in column order, and how many texts contain each one."""
+    count_params = CountVectorizer().get_params()
+    params = {
+        name: value for name, value in TfidfVectorizer(**vectorizer_params).get_params().items()
+        if name in count_params
+    }
+    vectorizer = CountVectorizer(**params)
+    try:
+        counts = vectorizer.fit_transform(texts)
+    except ValueError:
+        # No terms at all in this shard's texts for the field.
+        return [], np.zeros(0, dtype=np.int64)
+
+    terms = vectorizer.get_feature_names_out().tolist()
+    return terms, np.bincount(counts.indices, minlength=len(terms))
+
+
+def global_statistics(shard_frequencies, num_docs, vectorizer_params):
+    """Merges the per-shard document frequencies of one field into the
+    (vocabulary, idf) pair a TfidfVectorizer fitted on the whole corpus would have."""
+    totals = {}
+    for terms, frequencies in shard_frequencies:
+        for term, frequency in zip(terms, frequencies.tolist()):
+            totals[term] = totals.get(term, 0) + frequency
+
+    # TfidfVectorizer numbers its vocabulary in sorted term order.
+    terms = sorted(totals)
+    vocabulary = {term: column for column, term in enumerate(terms)}
+    df = np.array([totals[term] for term in terms], dtype=np.float64)
+
+    smooth = int(TfidfVectorizer(**vectorizer_params).smooth_idf)
+    idf = np.log((num_docs + smooth) / (df + smooth)) + 1
+    return vocabulary, idf
+
+
+def run_shard(shard_id, docs, text_fields, keyword_fields, vectorizer_params, requests, results):
+    """Body of a shard process.
+
+    Reports the shard's document frequencies, fits its index once the global
+    statistics arrive, then answers (request_id, query, filter_dict,
+    boost_dict, num_results) requests until it receives None.
+    """
+    try:
+        frequencies = {
+            field: document_frequencies([doc.get(field, '') for doc in docs], vectorizer_params)
+            for field in text_fields
+        }
+        results.put((None, shard_id, frequencies))
+
+        statistics = requests.get()
+        if statistics is None:
+            return
+        index = minsearch.Index(text_fields, keyword_fields, vectorizer_params)
+        index.fit(docs, statistics=statistics)
+        results.put((None, shard_id, None))
+    except Exception as e:
+        results.put((None, shard_id, e))
+        return
+
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+
+        request_id, query, filter_dict, boost_dict, num_results = request
+        try:
+            if docs:
+                hits = index.search(
+                    query, filter_dict, boost_dict, min(num_results, len(docs)), output_scores=True
+                )
+            else:
+                hits = []
+            results.put((request_id, shard_id, hits))
+        except Exception as e:
+            results.put((request_id, shard_id, e))
+
+
+class ShardedIndex:
+    """
+    A search index with the interface of minsearch.Index whose documents are spread over shard processes.
+
+    Attributes:
+        text_fields (list): List of text field names to index.
+        keyword_fields (list): List of keyword field names to index.
+        vectorizer_params (dict): Parameters passed to every shard's TfidfVectorizer.
+        num_shards (int): Number of shard processes.
+    """
+
+    def __init__(self, text_fields, keyword_fields, vectorizer_params={}, num_shards=2):
+        """
+        Initializes the ShardedIndex with specified text and keyword fields.
+
+        Args:
+            text_fields (list): List of text field names to index.
+            keyword_fields (list): List of keyword field names to index.
+            vectorizer_params (dict): Optional parameters to pass to TfidfVectorizer.
+            num_shards (int): Number of shard processes to start. Defaults to 2.
+        """
+        unsupported = [name for name in UNSUPPORTED_PARAMS if name in vectorizer_params]
+        if unsupported:
+            raise ValueError(f"Sharded indexes do not support vectorizer parameters: {unsupported}")
+
+        self.text_fields = text_fields
+        self.keyword_fields = keyword_fields
+        self.vectorizer_params = vectorizer_params
+        self.num_shards = num_shards
+
+        self.processes = []
+        self.requests = []
+        self.results = None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.dispatcher = None
+
+    def fit(self, docs):
+        """
+        Starts the shard processes and fits each one on its slice of the provided documents.
+
+        Args:
+            docs (list of dict): List of documents to index. Each document is a dictionary.
+        """
+        context = multiprocessing.get_context()
+        self.results = context.Queue()
+        self.requests = [context.Queue() for _ in range(self.num_shards)]
+        self.processes = [
+            context.Process(
+                target=run_shard,
+                args=(
+                    shard_id, docs[shard_id::self.num_shards], self.text_fields,
+                    self.keyword_fields, self.vectorizer_params,
+                    self.requests[shard_id], self.results,
+                ),
+                daemon=True,
+            )
+            for shard_id in range(self.num_shards)
+        ]
+        for process in self.processes:
+            process.start()
+
+        frequencies = self.collect_from_shards()
+        statistics = {
+            field: global_statistics(
+                [frequencies[shard_id][field] for shard_id in range(self.num_shards)],
+                len(docs),
+                self.vectorizer_params,
+            )
+            for field in self.text_fields
+        }
+        for requests in self.requests:
+            requests.put(statistics)
+        self.collect_from_shards()
+
+        self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+        self.dispatcher.start()
+        return self
+
+    def collect_from_shards(self):
+        # One message from every shard during fit; any error stops all shards.
+        messages = {}
+        for _ in range(self.num_shards):
+            _, shard_id, payload = self.results.get()
+            if isinstance(payload, Exception):
+                self.close()
+                raise RuntimeError(f"Shard {shard_id} failed to build its index") from payload
+            messages[shard_id] = payload
+        return messages
+
+    def dispatch(self):
+        # Routes shard replies to the waiting search calls, so several
+        # threads can query the shards at the same time.
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+
+            request_id, shard_id, hits = message
+            with self.lock:
+                entry = self.pending.get(request_id)
+                if entry is None:
+                    continue
+                future, shard_hits = entry
+                if isinstance(hits, Exception):
+                    del self.pending[request_id]
+                else:
+                    shard_hits.append(hits)
+                    if len(shard_hits) < self.num_shards:
+                        continue
+                    del self.pending[request_id]
+
+            if isinstance(hits, Exception):
+                future.set_exception(hits)
+            else:
+                future.set_result(shard_hits)
+
+    def search(self, query, filter_dict={}, boost_dict={}, num_results=10, output_scores=False, timeout=None):
+        """
+        Searches every shard in parallel and merges their results.
+
+        Args:
+            query (str): The search query string.
+            filter_dict (dict): Dictionary of keyword fields to filter by. Keys are field names and values are the values to filter by.
+            boost_dict (dict): Dictionary of boost scores for text fields. Keys are field names and values are the boost scores.
+            num_results (int): The number of top results to return. Defaults to 10.
+            output_scores (bool): If True, return (document, score) pairs instead of documents.
+            timeout (float): Seconds to wait for the shards; raises TimeoutError after that.
+
+        Returns:
+            list of dict: List of documents matching the search criteria, ranked by relevance.
+        """
+        request_id = next(self.request_ids)
+        future = Future()
+        with self.lock:
+            self.pending[request_id] = (future, [])
+
+        for requests in self.requests:
+            requests.put((request_id, query, filter_dict, boost_dict, num_results))
+
+        try:
+            shard_hits = future.result(timeout=timeout)
+        except TimeoutError:
+            # Late replies for this request are dropped by dispatch().
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise
+
+        # Each shard's hits are already sorted best first.
+        merged = heapq.merge(*shard_hits, key=lambda hit: hit[1], reverse=True)
+        hits = list(itertools.islice(merged, num_results))
+
+        if output_scores:
+            return hits
+        return [doc for doc, _ in hits]
+
+    def close(self):
+        """Stops the shard processes."""
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self.dispatcher is not None:
+            self.results.put(None)
+            self.dispatcher.join()
+            self.dispatcher = None
+        self.processes = []
@@ -0,0 +1,162 @@
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+from concurrent.futures import Future
+
+import psycopg2.errors
+from psycopg2.extras import Json
+
+import db
+import admission
+
+# Coalesces identical questions that are answered at the same time. Requests
+# with the same normalized question and the same retrieved documents share one
+# run of the LLM answer and judge: inside a worker, later callers wait on the
+# first caller's Future; across gunicorn workers, callers queue on a Postgres
+# advisory lock for the key, and the leader stores its answer in
+# public.answer_flights before releasing the lock. A waiter only reuses an
+# answer completed after it arrived, so nothing is served from a cache.
+
+# "local" coalesces within a worker, "postgres" also across workers at the
+# cost of a database connection held for every question's LLM call, "off"
+# disables coalescing.
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "local")
+# How long a request waits for another worker's answer before computing its own.
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "60"))
+# Finished answers are only needed by requests that were already waiting.
+ANSWER_FLIGHTS_RETENTION = "10 minutes"
+
+# Fields of answer_data that account for LLM usage. A coalesced request spent
+# nothing, so its conversation row records zero for them.
+USAGE_FIELDS = [
+    "prompt_characters", "prompt_tokens", "candidates_characters", "candidates_tokens",
+    "total_tokens", "eval_prompt_characters", "eval_prompt_tokens",
+    "eval_candidates_characters", "eval_candidates_tokens", "eval_total_tokens", "gemini_cost",
+]
+
+
+def normalize_question(question):
+    question = unicodedata.normalize("NFKC", question).casefold()
+    return re.sub(r"\s+", " ", question).strip()
+
+
+def flight_key(question, search_results, model):
+    ids = ",".join(str(doc["id"]) for doc in search_results)
+    text = "\n".join([model, normalize_question(question), ids])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def shared_answer(answer_data):
+    """Copy of another request's answer_data, without its LLM usage."""
+    answer_data = dict(answer_data)
+    for field in USAGE_FIELDS:
+        answer_data[field] = 0
+    return answer_data
+
+
+class SingleFlight:
+    def __init__(self, mode=SINGLE_FLIGHT):
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def run(self, key, compute, deadline=None):
+        """Returns (result, shared): compute()'s result, or that of an
+        identical computation that was in flight, with shared=True.
+
+        With a deadline, waiting for another request's computation stops
+        with DeadlineExceeded when it passes. When that computation fails,
+        for instance because its own request's deadline passed first, the
+        waiters try again and one of them computes the result itself.
+        """
+        if self.mode == "off":
+            return compute(), False
+
+        while True:
+            if deadline is not None:
+                deadline.check("coalesced")
+            with self.lock:
+                future = self.flights.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self.flights[key] = future
+            if leader:
+                break
+
+            try:
+                return future.result(timeout=deadline.remaining() if deadline else None), True
+            except Exception:
+                if not future.done():
+                    admission.count("deadline_exceeded", "coalesced")
+                    raise admission.DeadlineExceeded("Deadline exceeded waiting for an identical question")
+                # The leader failed: its error belongs to its own request.
+
+        try:
+            if self.mode == "postgres":
+                result, shared = self.run_across_workers(key, compute, deadline)
+            else:
+                result, shared = compute(), False
+        except Exception as e:
+            with self.lock:
+                del self.flights[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.flights[key]
+        future.set_result(result)
+        return result, shared
+
+    def run_across_workers(self, key, compute, deadline=None):
+        try:
+            conn = db.get_db_connection(timeout=deadline.remaining() if deadline else None)
+            conn.autocommit = True
+        except Exception as e:
+            print(f"Single-flight coordination unavailable: {e}")
+            return compute(), False
+
+        # The advisory lock is held by this session and released when the
+        # connection closes, including when compute() fails.
+        wait = SINGLE_FLIGHT_WAIT_SECONDS
+        if deadline is not None:
+            wait = min(wait, deadline.remaining())
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT set_config('lock_timeout', %s, false), clock_timestamp()",
+                            (f"{max(1, int(wait * 1000))}ms",))
+                arrived = cur.fetchone()[1]
+                try:
+                    cur.execute("SELECT pg_advisory_lock(hashtextextended(%s, 0))", (key,))
+                except psycopg2.errors.LockNotAvailable:
+                    return compute(), False
+
+                cur.execute("""
+                    SELECT answer_data FROM public.answer_flights
+                    WHERE key = %s AND completed_at >= %s
+                """, (key, arrived))
+                row = cur.fetchone()
+                if row is not None:
+                    return row[0], True
+
+                result = compute()
+                try:
+                    cur.execute(f"""
+                        DELETE FROM public.answer_flights
+                        WHERE completed_at < clock_timestamp() - interval '{ANSWER_FLIGHTS_RETENTION}'
+                    """)
+                    cur.execute("""
+                        INSERT INTO public.answer_flights (key, answer_data, completed_at)
+                        VALUES (%s, %s, clock_timestamp())
+                        ON CONFLICT (key) DO UPDATE SET
+                            answer_data = EXCLUDED.answer_data,
+                            completed_at = EXCLUDED.completed_at
+                    """, (key, Json(result)))
+                except Exception as e:
+                    print(f"Error publishing single-flight answer: {e}")
+                return result, False
+        finally:
+            conn.close()
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Only rag.BOOST is needed, so rag must not set up Vertex AI.
+os.environ["LLM_BACKEND"] = "stub"
+
+import ingest
+import minsearch
+from rag import BOOST
+from evaluate_rag import GROUND_TRUTH_PATH
+
+# Checks that Index.search scores every document exactly as the reference
+# per-field TfidfVectorizer path (score_with_vectorizers) does, for the
+# default vectorizer settings and for ones the term lookup table must either
+# reproduce or fall back on. Run with pytest, or directly.
+
+VECTORIZER_PARAMS = [
+    {},
+    {'norm': None},
+    {'sublinear_tf': True},
+    {'use_idf': False},
+    {'binary': True},
+    {'norm': 'l1'},
+]
+
+DOCUMENT_LIMIT = 300
+QUERY_LIMIT = 50
+
+
+def build_index(vectorizer_params):
+    index = minsearch.Index(
+        text_fields=ingest.TEXT_FIELDS, keyword_fields=["id"], vectorizer_params=vectorizer_params
+    )
+    return index.fit(ingest.load_documents()[:DOCUMENT_LIMIT])
+
+
+def check_scores(vectorizer_params):
+    index = build_index(vectorizer_params)
+    queries = pd.read_csv(GROUND_TRUTH_PATH)['question'].head(QUERY_LIMIT)
+    for query in queries:
+        reference = index.score_with_vectorizers(query, BOOST)
+        hits = index.search(query, boost_dict=BOOST, num_results=10, output_scores=True)
+        top = np.argsort(-reference, kind='stable')[:len(hits)]
+        np.testing.assert_allclose(
+            [score for _, score in hits], reference[top], rtol=1e-9, atol=1e-12,
+            err_msg=f"vectorizer_params={vectorizer_params}, query={query!r}",
+        )
+
+
+def test_search_matches_vectorizers():
+    for vectorizer_params in VECTORIZER_PARAMS:
+        check_scores(vectorizer_params)
+
+
+def test_lookup_table_only_for_l2_norm():
+    assert build_index({}).term_lookup is not None
+    assert build_index({'norm': None}).term_lookup is None
+
+
+if __name__ == "__main__":
+    test_search_matches_vectorizers()
+    test_lookup_table_only_for_l2_norm()
+    print(f"Search scores match score_with_vectorizers for {len(VECTORIZER_PARAMS)} vectorizer settings")
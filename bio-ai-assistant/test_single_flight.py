@@ -0,0 +1,91 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+# single_flight imports db, whose timezone check needs Postgres.
+os.environ["RUN_TIMEZONE_CHECK"] = "0"
+
+import admission
+import single_flight
+
+# Checks how requests waiting on an identical question's computation are
+# affected when that computation fails. Run with pytest, or directly.
+
+
+def test_waiter_outlives_leader_deadline():
+    flights = single_flight.SingleFlight(mode="local")
+    leader_started = threading.Event()
+
+    def leader_compute():
+        leader_started.set()
+        sleep(0.2)
+        raise admission.DeadlineExceeded("Deadline exceeded during answer")
+
+    def waiter_compute():
+        return {"answer": "waiter"}
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(
+            flights.run, "key", leader_compute, deadline=admission.Deadline(0.1)
+        )
+        leader_started.wait()
+        waiter = executor.submit(
+            flights.run, "key", waiter_compute, deadline=admission.Deadline(5)
+        )
+
+        try:
+            leader.result()
+            raise AssertionError("the leader's computation should have failed")
+        except admission.DeadlineExceeded:
+            pass
+        # The waiter still had time, so it answered on its own.
+        assert waiter.result() == ({"answer": "waiter"}, False)
+    assert flights.flights == {}
+
+
+def test_waiter_shares_leader_answer():
+    flights = single_flight.SingleFlight(mode="local")
+    leader_started = threading.Event()
+
+    def leader_compute():
+        leader_started.set()
+        sleep(0.2)
+        return {"answer": "leader"}
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(flights.run, "key", leader_compute, deadline=admission.Deadline(5))
+        leader_started.wait()
+        waiter = executor.submit(flights.run, "key", lambda: {"answer": "waiter"},
+                                 deadline=admission.Deadline(5))
+        assert leader.result() == ({"answer": "leader"}, False)
+        assert waiter.result() == ({"answer": "leader"}, True)
+
+
+def test_waiter_deadline_still_applies():
+    flights = single_flight.SingleFlight(mode="local")
+    leader_started = threading.Event()
+
+    def leader_compute():
+        leader_started.set()
+        sleep(0.5)
+        return {"answer": "leader"}
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(flights.run, "key", leader_compute, deadline=admission.Deadline(5))
+        leader_started.wait()
+        waiter = executor.submit(flights.run, "key", lambda: {"answer": "waiter"},
+                                 deadline=admission.Deadline(0.1))
+        try:
+            waiter.result()
+            raise AssertionError("the waiter should have run out of time")
+        except admission.DeadlineExceeded:
+            pass
+        assert leader.result() == ({"answer": "leader"}, False)
+
+
+if __name__ == "__main__":
+    test_waiter_outlives_leader_deadline()
+    test_waiter_shares_leader_answer()
+    test_waiter_deadline_still_applies()
+    print("Single-flight tests passed")